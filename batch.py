@@ -0,0 +1,181 @@
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from parse_logfile import parse_logfile, table_exists, INSERT_BATCH_SIZE
+from parse_timestamp import parse_timestomp
+from parse_mft import parse_mft, MFT_RULES, DEFAULT_MFT_RULES
+
+LOGFILE_NAMES = ('$logfile', 'logfile', 'logfile.bin')  # Compared case-insensitively.
+MFT_NAMES = ('$mft', 'mft', 'mft.bin')
+SUMMARY_DB_NAME = 'summary.db'
+
+def find_evidence_file(directory, names):
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.lower() in names and os.path.isfile(os.path.join(directory, file_name)):
+            return os.path.join(directory, file_name)
+    return None
+
+def discover_evidence_sets(evidence_dir):
+    evidence_sets = []
+    for host in sorted(os.listdir(evidence_dir)):  # One sub directory per host.
+        host_dir = os.path.join(evidence_dir, host)
+        if not os.path.isdir(host_dir):
+            continue
+
+        logfile_path = find_evidence_file(host_dir, LOGFILE_NAMES)
+        if logfile_path is None:
+            print(f"[-] {host} : no $LogFile found, skipped.", file=sys.stderr)
+            continue
+        evidence_sets.append((host, logfile_path, find_evidence_file(host_dir, MFT_NAMES)))
+
+    return evidence_sets
+
+def read_manifest(manifest_path):
+    evidence_sets = []
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, newline='') as manifest:
+        for row in csv.DictReader(manifest):  # host,logfile,mft  (mft may be empty)
+            logfile_path = os.path.join(manifest_dir, row['logfile'].strip())
+            mft_path = os.path.join(manifest_dir, row['mft'].strip()) if (row.get('mft') or '').strip() else None
+            evidence_sets.append((row['host'].strip(), logfile_path, mft_path))
+
+    return evidence_sets
+
+def output_db_paths(evidence_sets, output_dir):
+    used_names = set()
+    db_paths = []
+    for host, _, _ in evidence_sets:
+        db_name = re.sub(r'[^A-Za-z0-9_.-]', '_', host) or 'host'
+        candidate, suffix = db_name, 1
+        while candidate.lower() in used_names:  # The same host may come with several snapshots.
+            suffix += 1
+            candidate = f'{db_name}_{suffix}'
+        used_names.add(candidate.lower())
+        db_paths.append(os.path.join(output_dir, f'{candidate}.db'))
+
+    return db_paths
+
+def process_evidence_set(host, logfile_path, mft_path, db_path, utc_offset, mft_rules, batch_size):
+    started = time.perf_counter()
+    try:
+        with open(logfile_path, 'rb') as logfile:
+            log_record_db_path = parse_logfile(logfile, logfile_path, 1, batch_size, False, db_path)  # Parallelism is across evidence sets.
+        parse_timestomp(log_record_db_path, utc_offset)
+
+        if mft_path and os.path.exists(mft_path):
+            with open(mft_path, 'rb') as mftfile:
+                parse_mft(mftfile, mft_path, utc_offset, log_record_db_path, 1, mft_rules)
+    except (Exception, SystemExit) as error:  # One broken image must not stop the case, sys.exit is used for bad magic numbers.
+        return host, logfile_path, mft_path, db_path, 'failed', str(error), time.perf_counter() - started
+
+    return host, logfile_path, mft_path, db_path, 'completed', None, time.perf_counter() - started
+
+def init_summary_db(summary_db_path):
+    if os.path.exists(summary_db_path):
+        os.remove(summary_db_path)
+
+    conn = sqlite3.connect(summary_db_path)
+    conn.execute('''
+        CREATE TABLE BatchRun (
+            host TEXT,
+            logfile_path TEXT,
+            mft_path TEXT,
+            db_path TEXT,
+            status TEXT,
+            error TEXT,
+            seconds REAL,
+            logfile_records INTEGER,
+            timestomp_flagged INTEGER,
+            si_fn_flagged INTEGER
+        )
+    ''')
+    return conn
+
+def evidence_table_exists(conn, table_name):
+    return conn.execute("SELECT 1 FROM evidence.sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone() is not None
+
+def copy_flagged_rows(conn, host, summary_table, source_query):
+    if not table_exists(conn, summary_table):  # The first host decides the columns, every host runs the same schema.
+        conn.execute(f'CREATE TABLE {summary_table} AS SELECT ? AS host, * FROM ({source_query}) WHERE 0', (host,))
+    conn.execute(f'INSERT INTO {summary_table} SELECT ?, * FROM ({source_query})', (host,))
+
+def consolidate(summary_db_path, results):
+    conn = init_summary_db(summary_db_path)
+    try:
+        for host, logfile_path, mft_path, db_path, status, error, seconds in results:
+            counts = (None, None, None)
+            if status == 'completed':
+                conn.execute('ATTACH DATABASE ? AS evidence', (db_path,))
+                logfile_records = conn.execute('SELECT count(*) FROM evidence.LogFile').fetchone()[0]
+                timestomp_flagged = conn.execute('SELECT count(*) FROM evidence.TimeStomp WHERE is_timestomped = 1').fetchone()[0]
+                si_fn_flagged = None
+
+                copy_flagged_rows(conn, host, 'FlaggedTimeStomp', 'SELECT * FROM evidence.TimeStomp WHERE is_timestomped = 1')
+                if evidence_table_exists(conn, 'si_fn'):
+                    si_fn_flagged = conn.execute('SELECT count(*) FROM evidence.si_fn').fetchone()[0]
+                    copy_flagged_rows(conn, host, 'FlaggedSIFN', 'SELECT * FROM evidence.si_fn')
+                if evidence_table_exists(conn, 'ConfirmedTimeStomp'):
+                    copy_flagged_rows(conn, host, 'ConfirmedTimeStomp', 'SELECT * FROM evidence.ConfirmedTimeStomp')
+
+                conn.commit()
+                conn.execute('DETACH DATABASE evidence')
+                counts = (logfile_records, timestomp_flagged, si_fn_flagged)
+
+            conn.execute('INSERT INTO BatchRun VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         (host, logfile_path, mft_path, db_path, status, error, seconds, *counts))
+
+        for summary_table in ('FlaggedTimeStomp', 'FlaggedSIFN', 'ConfirmedTimeStomp'):
+            if table_exists(conn, summary_table):
+                conn.execute(f'CREATE INDEX idx_{summary_table.lower()}_host ON {summary_table} (host)')
+        conn.commit()
+    finally:
+        conn.close()
+
+def run_batch(evidence_sets, output_dir, utc_offset, processes=None, mft_rules=DEFAULT_MFT_RULES, batch_size=INSERT_BATCH_SIZE):
+    os.makedirs(output_dir, exist_ok=True)
+    db_paths = output_db_paths(evidence_sets, output_dir)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(process_evidence_set, host, logfile_path, mft_path, db_path, utc_offset, mft_rules, batch_size)
+            for (host, logfile_path, mft_path), db_path in zip(evidence_sets, db_paths)
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"[{'+' if result[4] == 'completed' else '-'}] {result[0]} : {result[4]} in {result[6]:.1f}s" + (f" ({result[5]})" if result[5] else ""))
+            results.append(result)
+
+    results.sort(key=lambda result: db_paths.index(result[3]))  # Summary rows follow the manifest order.
+    summary_db_path = os.path.join(output_dir, SUMMARY_DB_NAME)
+    consolidate(summary_db_path, results)
+    return summary_db_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process many $LogFile / $MFT evidence sets in parallel.")
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument("-d", "--evidence-dir", help="Directory with one sub directory per host holding $LogFile and optionally $MFT.")
+    source_group.add_argument("-l", "--manifest", help="CSV manifest with host,logfile,mft columns.")
+    parser.add_argument("-t", "--utc", required=True, help="Enter UTC Time.")
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="Directory for the per-host databases and summary.db.")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="Evidence sets processed at once (default: CPU count).")
+    parser.add_argument("-r", "--mft-rules", default=",".join(DEFAULT_MFT_RULES), help=f"Comma separated SI / FN rules ({', '.join(MFT_RULES)}).")
+    parser.add_argument("-b", "--batch-size", type=int, default=INSERT_BATCH_SIZE, help="Records buffered before each SQLite flush.")
+    args = parser.parse_args()
+
+    mft_rules = tuple(rule.strip() for rule in args.mft_rules.split(",") if rule.strip())
+    if not mft_rules or any(rule not in MFT_RULES for rule in mft_rules):
+        parser.error(f"--mft-rules must be a subset of {', '.join(MFT_RULES)}.")
+
+    evidence_sets = discover_evidence_sets(args.evidence_dir) if args.evidence_dir else read_manifest(args.manifest)
+    if not evidence_sets:
+        sys.exit("No evidence sets found.")
+
+    summary_db_path = run_batch(evidence_sets, args.output_dir, args.utc, args.processes, mft_rules, args.batch_size)
+    print(f"[+] Batch completed, summary written to {summary_db_path}.")
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+
+from structure_print import PAGE_SIZE, MFT_ENTRY_SIZE
+from synthetic import write_logfile, write_mft, parse_size, DEFAULT_TIMESTOMP_RATIO
+
+DEFAULT_SIZES = ('64M', '1G', '4G')
+STAGES = ('logfile', 'timestomp', 'mft')
+DEFAULT_MFT_SIZE = '256M'  # 256 Ki entries, one $MFT shared by every $LogFile size.
+
+def run_stage(stage, logfile_path, mft_path, utc, workers):
+    # Runs in a child process so that its peak RSS is measured on its own.
+    from parse_logfile import parse_logfile
+    from parse_timestamp import parse_timestomp
+    from parse_mft import parse_mft
+
+    log_record_db_path = os.path.abspath('log_records.db')
+    started = time.perf_counter()
+    if stage == 'logfile':
+        with open(logfile_path, 'rb') as logfile:
+            parse_logfile(logfile, logfile_path, workers)
+    elif stage == 'timestomp':
+        parse_timestomp(log_record_db_path, utc)
+    else:
+        with open(mft_path, 'rb') as mftfile:
+            parse_mft(mftfile, mft_path, utc, log_record_db_path, workers)
+    seconds = time.perf_counter() - started
+
+    conn = sqlite3.connect(log_record_db_path)
+    try:
+        if stage == 'logfile':
+            records = conn.execute('SELECT count(*) FROM LogFile').fetchone()[0]
+            input_size = os.path.getsize(logfile_path)
+        elif stage == 'timestomp':
+            records = conn.execute('SELECT count(*) FROM TimeStomp').fetchone()[0]
+            input_size = conn.execute('SELECT coalesce(sum(length(redo_data) + length(undo_data)), 0) FROM LogFile').fetchone()[0]
+        else:
+            records = os.path.getsize(mft_path) // MFT_ENTRY_SIZE
+            input_size = os.path.getsize(mft_path)
+    finally:
+        conn.close()
+
+    return {'seconds': seconds, 'records': records, 'input_bytes': input_size}
+
+def measure_stage(stage, run_dir, logfile_path, mft_path, utc, workers):
+    command = [sys.executable, os.path.abspath(__file__), '--stage', stage,
+               '--logfile', logfile_path, '--mft', mft_path, '--utc', str(utc), '--workers', str(workers)]
+    child_env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (os.path.dirname(os.path.abspath(__file__)), os.environ.get('PYTHONPATH')))))
+    process = subprocess.Popen(command, cwd=run_dir, stdout=subprocess.PIPE, env=child_env)
+    output = process.stdout.read()
+    _, status, rusage = os.wait4(process.pid, 0)  # rusage of this child only.
+    exit_code = os.waitstatus_to_exitcode(status)
+    if exit_code != 0:
+        raise RuntimeError(f"Stage {stage} failed with exit code {exit_code}.")
+
+    result = json.loads(output.decode().strip().splitlines()[-1])
+    pages = os.path.getsize(logfile_path) // PAGE_SIZE if stage == 'logfile' else result['input_bytes'] // PAGE_SIZE
+    seconds = result['seconds'] or 1e-9
+    return {
+        'stage': stage,
+        'seconds': round(result['seconds'], 4),
+        'cpu_seconds': round(rusage.ru_utime + rusage.ru_stime, 4),
+        'pages': pages,
+        'records': result['records'],
+        'input_bytes': result['input_bytes'],
+        'pages_per_second': round(pages / seconds, 1),
+        'records_per_second': round(result['records'] / seconds, 1),
+        'mb_per_second': round(result['input_bytes'] / (1 << 20) / seconds, 2),
+        'peak_rss_kib': rusage.ru_maxrss,  # KiB on Linux.
+    }
+
+def prepare_mft(work_dir, mft_size, seed, timestomp_ratio, regenerate=False):
+    mft_path = os.path.join(work_dir, f'MFT_{mft_size}_{seed}.bin')
+    if regenerate or not os.path.exists(mft_path):  # Generated inputs are kept and reused by later runs.
+        write_mft(mft_path, parse_size(mft_size) // MFT_ENTRY_SIZE, seed, timestomp_ratio)
+    return mft_path
+
+def prepare_logfile(work_dir, size, mft_size, seed, timestomp_ratio, regenerate=False):
+    page_count = parse_size(size) // PAGE_SIZE
+    logfile_path = os.path.join(work_dir, f'LogFile_{size}_{mft_size}_{seed}.bin')  # Its records point into the $MFT.
+    if regenerate or not os.path.exists(logfile_path):
+        write_logfile(logfile_path, page_count, seed, timestomp_ratio=timestomp_ratio,
+                      mft_entry_count=parse_size(mft_size) // MFT_ENTRY_SIZE, wrap_page=4 + (page_count - 4) // 3)
+    return logfile_path
+
+def run_benchmark(work_dir, sizes, stages, mft_size=DEFAULT_MFT_SIZE, seed=0, utc=0, workers=1, timestomp_ratio=DEFAULT_TIMESTOMP_RATIO, regenerate=False):
+    work_dir = os.path.abspath(work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    results = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'workers': workers,
+        'seed': seed,
+        'mft_size': mft_size,
+        'runs': [],
+    }
+
+    mft_path = prepare_mft(work_dir, mft_size, seed, timestomp_ratio, regenerate) if 'mft' in stages else ''
+    for size in sizes:
+        logfile_path = prepare_logfile(work_dir, size, mft_size, seed, timestomp_ratio, regenerate)
+        run_dir = os.path.join(work_dir, f'run_{size}')
+        os.makedirs(run_dir, exist_ok=True)
+
+        last_stage = max(STAGES.index(stage) for stage in stages)
+        for stage in STAGES[:last_stage + 1]:  # Later stages read the database written by the earlier ones.
+            measurement = measure_stage(stage, run_dir, logfile_path, mft_path, utc, workers)
+            if stage in stages:
+                measurement['size'] = size
+                results['runs'].append(measurement)
+                print(f"[+] {size:>5} {stage:<9} {measurement['seconds']:>9.2f}s "
+                      f"{measurement['pages_per_second']:>11.1f} pages/s {measurement['records_per_second']:>11.1f} records/s "
+                      f"{measurement['mb_per_second']:>8.2f} MB/s {measurement['peak_rss_kib'] // 1024:>6} MiB")
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure parsing throughput on synthetic $LogFile / $MFT inputs.")
+    parser.add_argument("-d", "--work-dir", default="benchmark_data", help="Directory for generated inputs and databases.")
+    parser.add_argument("-s", "--sizes", default=",".join(DEFAULT_SIZES), help="Comma separated $LogFile sizes, e.g. 64M,1G,4G.")
+    parser.add_argument("-m", "--mft-size", default=DEFAULT_MFT_SIZE, help="Size of the generated $MFT, shared by all --sizes.")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma separated stages ({', '.join(STAGES)}).")
+    parser.add_argument("-o", "--output", default=None, help="Write the results as JSON to this file.")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Number of processes for RCRD page and $MFT parsing.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the generated inputs.")
+    parser.add_argument("--timestomp-ratio", type=float, default=DEFAULT_TIMESTOMP_RATIO, help="Share of injected time-stomps.")
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate inputs even if they exist.")
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)  # Internal, one measured stage per child process.
+    parser.add_argument("--logfile", help=argparse.SUPPRESS)
+    parser.add_argument("--mft", help=argparse.SUPPRESS)
+    parser.add_argument("--utc", default="0", help="UTC offset used for the timestamp columns.")
+    args = parser.parse_args()
+
+    if args.stage:
+        print(json.dumps(run_stage(args.stage, args.logfile, args.mft, args.utc, args.workers)))
+        sys.exit(0)
+
+    stages = tuple(stage.strip() for stage in args.stages.split(",") if stage.strip())
+    if not stages or any(stage not in STAGES for stage in stages):
+        parser.error(f"--stages must be a subset of {', '.join(STAGES)}.")
+
+    results = run_benchmark(args.work_dir, [size.strip() for size in args.sizes.split(",") if size.strip()], stages,
+                            args.mft_size, args.seed, args.utc, args.workers, args.timestomp_ratio, args.regenerate)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f"[+] Results written to {args.output}.")
@@ -0,0 +1,66 @@
+import csv
+import json
+import sys
+
+from log_record import to_sqlite_int
+
+HISTORY_COLUMNS = (
+    'this_lsn', 'previous_lsn', 'client_undo_lsn', 'transaction_id', 'record_type',
+    'redo_op_name', 'undo_op_name', 'target_vcn', 'cluster_number', 'record_offset', 'attr_offset'
+)
+HISTORY_SELECT = f'SELECT rowid, {", ".join(HISTORY_COLUMNS)} FROM LogFile'
+HISTORY_FORMATS = ('csv', 'jsonl')
+
+def fetch_by_lsn(conn, this_lsn):
+    return conn.execute(f'{HISTORY_SELECT} WHERE this_lsn = ? ORDER BY rowid DESC LIMIT 1', (this_lsn,)).fetchone()  # idx_logfile_this_lsn
+
+def fetch_successor(conn, this_lsn, transaction_id):
+    return conn.execute(f'{HISTORY_SELECT} WHERE previous_lsn = ? AND transaction_id = ? ORDER BY rowid DESC LIMIT 1',
+                        (this_lsn, transaction_id)).fetchone()  # idx_logfile_previous_lsn
+
+def previous_lsn_chain(conn, this_lsn, limit=None):
+    # The record and the records before it in its transaction, newest first, one indexed lookup per record.
+    chain = []
+    seen = set()
+    row = fetch_by_lsn(conn, to_sqlite_int(this_lsn))
+    while row is not None and row[0] not in seen and (limit is None or len(chain) < limit):
+        seen.add(row[0])  # rowid, a broken ring may point a chain back into itself.
+        chain.append(row)
+        previous_lsn, transaction_id = row[2], row[4]
+        if not previous_lsn:  # First record of the transaction.
+            break
+        row = fetch_by_lsn(conn, previous_lsn)
+        if row is not None and transaction_id is not None and row[4] != transaction_id:  # Overwritten by a later lap.
+            break
+    return chain
+
+def transaction_records(conn, this_lsn):
+    # Every record of the transaction holding this_lsn, oldest first, from the first record to the commit.
+    chain = previous_lsn_chain(conn, this_lsn)
+    if not chain:
+        return []
+
+    records = chain[::-1]
+    seen = {row[0] for row in records}
+    transaction_id = records[-1][4]
+    if transaction_id is None:  # Rows of a release that did not keep transaction_id, only the backward chain is known.
+        return records
+
+    row = fetch_successor(conn, records[-1][1], transaction_id)
+    while row is not None and row[0] not in seen:
+        seen.add(row[0])
+        records.append(row)
+        row = fetch_successor(conn, row[1], transaction_id)
+    return records
+
+def write_history_rows(rows, output_format='csv', output=None):
+    output = output or sys.stdout
+    rows = [tuple(f'0x{value & 0xFFFFFFFFFFFFFFFF:X}' if isinstance(value, int) else value for value in row[1:])
+            for row in rows]  # Same rendering as LogFile_hex.
+    if output_format == 'jsonl':
+        output.writelines(json.dumps(dict(zip(HISTORY_COLUMNS, row))) + "\n" for row in rows)
+    else:
+        writer = csv.writer(output)
+        writer.writerow(HISTORY_COLUMNS)
+        writer.writerows(rows)
+    return len(rows)
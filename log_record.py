@@ -0,0 +1,146 @@
+import struct
+
+try:
+    import numpy
+except ImportError:  # Optional, the masks are only used by read_records.
+    numpy = None
+
+from structure_print import (
+    RECORD_HEADER_STRUCTURE, LogRecordHeader,
+    RECORD_FILTER_STRUCTURE, RECORD_FILTER_OFFSET,
+    OPCODE_MAP
+)
+
+RECORD_HEADER = struct.Struct(RECORD_HEADER_STRUCTURE)
+RECORD_FILTER = struct.Struct(RECORD_FILTER_STRUCTURE)
+EMPTY_RESERVED = b'\x00' * 6
+VALID_CLUSTER_NUMBERS = frozenset((0x00, 0x02, 0x04, 0x06))
+TIMESTAMP_RECORDS = {  # record_offset : {attr_offset : timestamp bytes}, the UpdateResidentValue rows parse_timestamp reads.
+    0x38: {0x18: 0x20, 0x20: 0x18, 0x28: 0x10, 0x30: 0x08},              # STANDARD_INFORMATION
+    0x98: {0x18: 0x28, 0x20: 0x20, 0x28: 0x18, 0x30: 0x10, 0x38: 0x08},  # FILE_NAME, 0x18 starts at the parent reference.
+}
+NO_TIMESTAMP_ATTRS = {}
+SEQUENCE_NUMBER_BITS_OFFSET = 0x40  # Restart area (0x30) + 0x10, past RSTR_HEADER_STRUCTURE.
+
+if numpy is not None:
+    RECORD_HEADER_DTYPE = numpy.dtype(list(zip(LogRecordHeader._fields, (  # Same layout as RECORD_HEADER_STRUCTURE (Size = 0x58).
+        '<u8', '<u8', '<u8', '<u4', '<u4', '<u4', '<u4', '<u2', 'V6',
+        '<u2', '<u2', '<u2', '<u2', '<u2', '<u2', '<u2', '<u2', '<u2', '<u2', '<u2', '<u2', '<u8', '<u8'))))
+    RECORD_HEADER_BYTES = numpy.arange(RECORD_HEADER_DTYPE.itemsize)
+    RESERVED_BYTES = slice(RECORD_FILTER_OFFSET, RECORD_FILTER_OFFSET + len(EMPTY_RESERVED))
+    TIMESTAMP_RECORD_KEYS = numpy.array([record_offset << 16 | attr_offset
+                                         for record_offset, attrs in TIMESTAMP_RECORDS.items() for attr_offset in attrs])
+
+def header_passes_filter(reserved, redo_op, undo_op, redo_offset, redo_length, cluster_number, page_size):
+    return (reserved == EMPTY_RESERVED and  # Condition filter to become a record.
+            redo_offset == 0x28 and
+            redo_op <= 0x21 and
+            undo_op <= 0x21 and
+            cluster_number in VALID_CLUSTER_NUMBERS and
+            page_size == 0x02 and
+            redo_length != 0x00)
+
+def header_filter_mask(header_bytes, headers):
+    # header_passes_filter over the rows of RECORD_HEADER_DTYPE headers.
+    return (~header_bytes[:, RESERVED_BYTES].any(axis=1) &
+            (headers['redo_offset'] == 0x28) &
+            (headers['redo_op'] <= 0x21) &
+            (headers['undo_op'] <= 0x21) &
+            numpy.isin(headers['cluster_number'], tuple(VALID_CLUSTER_NUMBERS)) &
+            (headers['page_size'] == 0x02) &
+            (headers['redo_length'] != 0x00))
+
+def header_reject_reason(reserved, redo_op, undo_op, redo_offset, cluster_number, page_size):
+    if reserved != EMPTY_RESERVED:
+        return 'reserved_not_zero'
+    if redo_offset != 0x28:
+        return 'redo_offset'
+    if redo_op > 0x21:
+        return 'redo_op'
+    if undo_op > 0x21:
+        return 'undo_op'
+    if cluster_number not in VALID_CLUSTER_NUMBERS:
+        return 'cluster_number'
+    if page_size != 0x02:
+        return 'page_size'
+    return 'redo_length'
+
+def detection_bytes(redo_op, undo_op, record_offset, attr_offset):
+    # Timestamp bytes kept with --detect-only, None for the records detection never reads.
+    if redo_op != 0x07 or undo_op != 0x07:
+        return None
+    return TIMESTAMP_RECORDS.get(record_offset, NO_TIMESTAMP_ATTRS).get(attr_offset)
+
+def detection_mask(headers):
+    # detection_bytes is not None, over the rows of RECORD_HEADER_DTYPE headers.
+    return ((headers['redo_op'] == 0x07) & (headers['undo_op'] == 0x07) &
+            numpy.isin(headers['record_offset'].astype(numpy.int64) << 16 | headers['attr_offset'], TIMESTAMP_RECORD_KEYS))
+
+def find_hex(logfile_data, search_hexs, byte_size, start=0, end=None):
+    if not isinstance(search_hexs, list):
+        search_hexs = [search_hexs]
+
+    compiled_patterns = []
+    for pattern in search_hexs:
+        if isinstance(pattern, int):
+            compiled_patterns.append(pattern.to_bytes(byte_size, byteorder='little'))
+        elif isinstance(pattern, bytes):
+            if len(pattern) != byte_size:
+                raise ValueError(f"Byte pattern must be exactly {byte_size} bytes long.")
+            compiled_patterns.append(pattern)
+        else:
+            raise TypeError("Patterns must be int or bytes.")
+
+    if not hasattr(logfile_data, 'find'):  # memoryview has no find(), bytes and mmap do.
+        logfile_data = bytes(logfile_data)
+
+    data_len = len(logfile_data)
+    end = data_len if end is None else min(end, data_len)
+
+    matched_offsets = []
+    for pattern in dict.fromkeys(compiled_patterns):
+        offset = logfile_data.find(pattern, start, end)
+        while offset != -1:
+            relative_offset = offset - start
+            misalignment = relative_offset % 8
+            if misalignment == 0:
+                matched_offsets.append(relative_offset)
+                offset = logfile_data.find(pattern, offset + 8, end)
+            else:
+                offset = logfile_data.find(pattern, offset + 8 - misalignment, end)  # Jump to the next 8-byte slot.
+
+    return sorted(matched_offsets)
+
+def read_sequence_number_bits(source):
+    page_offset = source.load(0)
+    sequence_number_bits, = struct.unpack_from('<I', source.buffer, page_offset + SEQUENCE_NUMBER_BITS_OFFSET)
+    return sequence_number_bits
+
+def lsn_offset_mask(sequence_number_bits):
+    # The low (64 - sequence_number_bits) bits of an LSN are its file offset / 8, None when the RSTR value is unusable.
+    return (1 << (64 - sequence_number_bits)) - 1 if 0 < sequence_number_bits < 61 else None
+
+def to_sqlite_int(value):
+    return value - (1 << 64) if value >= (1 << 63) else value  # SQLite INTEGER is signed 64-bit.
+
+def insert_log_record(conn, record_header, redo_data: bytes, undo_data: bytes, insert_buffer):
+    insert_buffer.append((
+        to_sqlite_int(record_header.this_lsn),
+        to_sqlite_int(record_header.previous_lsn),
+        record_header.record_type,
+        record_header.redo_op,
+        OPCODE_MAP.get(record_header.redo_op, "UNKNOWN"),
+        bytes(redo_data),
+        record_header.redo_length,
+        record_header.undo_op,
+        OPCODE_MAP.get(record_header.undo_op, "UNKNOWN"),
+        bytes(undo_data),
+        record_header.undo_length,
+        to_sqlite_int(record_header.target_vcn),
+        to_sqlite_int(record_header.target_lcn),
+        record_header.cluster_number,
+        record_header.record_offset,
+        record_header.attr_offset,
+        to_sqlite_int(record_header.client_undo_lsn),
+        record_header.transaction_id
+    ))  # New columns go last, the row indices used by select_relevant_records and the detection filters stay put.
@@ -1,24 +1,153 @@
 import argparse
-from parse_logfile import parse_logfile
-from parse_timestamp import parse_timestomp
-from parse_mft import parse_mft
+import sys
+import stats
+from parse_logfile import parse_logfile, iter_log_records, get_schema_version, table_exists, INSERT_BATCH_SIZE
+from parse_timestamp import parse_timestomp, stream_timestomps
+from sinks import open_sink, write_to_sink, SINK_TYPES
+from parse_mft import parse_mft, MFT_RULES, DEFAULT_MFT_RULES
+from timeline import build_timeline, query_timeline, write_timeline_rows, TIMELINE_FORMATS, TIMELINE_SIDES
+from history import previous_lsn_chain, transaction_records, write_history_rows, HISTORY_FORMATS
+from structure_print import string_to_filetime
 import os
+import sqlite3
+
+def run_query(argv):
+    parser = argparse.ArgumentParser(prog="main.py query", description="Query the Timeline table of an output database.")
+    parser.add_argument("-d", "--db", default="log_records.db", help="Database written by an earlier run.")
+    parser.add_argument("-t", "--utc", default=0, help="UTC offset for --start / --end and the rendered times.")
+    parser.add_argument("--start", default=None, help="Window start, 'YYYY-MM-DD[ HH:MM:SS]' or a raw FILETIME (inclusive).")
+    parser.add_argument("--end", default=None, help="Window end, 'YYYY-MM-DD[ HH:MM:SS]' or a raw FILETIME (exclusive).")
+    parser.add_argument("-e", "--mft-entry", type=int, default=None, help="Only events of this $MFT entry.")
+    parser.add_argument("--flagged-only", action="store_true", help="Only events of time-stomped rows.")
+    parser.add_argument("--source", choices=tuple(TIMELINE_SIDES), default=None, help="Only events from TimeStomp or si_fn.")
+    parser.add_argument("-l", "--limit", type=int, default=None, help="Return at most this many events.")
+    parser.add_argument("--format", choices=TIMELINE_FORMATS, default="csv", help="Output format on stdout.")
+    args = parser.parse_args(argv)
+
+    try:
+        start = string_to_filetime(args.start, args.utc) if args.start else None
+        end = string_to_filetime(args.end, args.utc) if args.end else None
+    except ValueError as error:
+        parser.error(f"--start / --end : {error}")
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist.")
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if not table_exists(conn, 'Timeline'):
+            if get_schema_version(conn) < 2:
+                parser.error(f"{args.db} has no *_filetime columns to build the Timeline from (written before PRAGMA user_version = 2).")
+            conn.close()
+            build_timeline(args.db)  # Built on first query, runs drop it when TimeStomp or si_fn change.
+            conn = sqlite3.connect(args.db)
+        rows = query_timeline(conn, start, end, args.mft_entry, args.flagged_only, args.source, args.limit)
+        row_count = write_timeline_rows(rows, args.utc, args.format)
+    finally:
+        conn.close()
+    print(f"[+] {row_count} events.", file=sys.stderr)
+
+def run_history(argv):
+    parser = argparse.ArgumentParser(prog="main.py history", description="Walk the transaction or previous-LSN chain of a LogFile record.")
+    parser.add_argument("lsn", help="this_lsn of the record, decimal or 0x hex.")
+    parser.add_argument("-d", "--db", default="log_records.db", help="Database written by an earlier run.")
+    parser.add_argument("--chain", action="store_true", help="Only the record and its previous-LSN chain, newest first.")
+    parser.add_argument("-l", "--limit", type=int, default=None, help="With --chain, follow at most this many records.")
+    parser.add_argument("--format", choices=HISTORY_FORMATS, default="csv", help="Output format on stdout.")
+    args = parser.parse_args(argv)
+
+    try:
+        this_lsn = int(args.lsn, 0)
+    except ValueError:
+        parser.error(f"{args.lsn} is not an LSN.")
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist.")
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if not table_exists(conn, 'LogFile'):
+            parser.error(f"{args.db} has no LogFile table (--stream runs do not keep one).")
+        rows = previous_lsn_chain(conn, this_lsn, args.limit) if args.chain else transaction_records(conn, this_lsn)
+        row_count = write_history_rows(rows, args.format)
+    finally:
+        conn.close()
+    print(f"[+] {row_count} records.", file=sys.stderr)
+
+SUBCOMMANDS = {"query": run_query, "history": run_history}
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
+        sys.exit(0)
+
     parser = argparse.ArgumentParser()
     parser.add_argument("-f", "--logfile", required=True, help="Enter $LogFile File.")
     parser.add_argument("-t", "--utc", required=True, help="Enter UTC Time.")
     parser.add_argument("-m", "--mft", required=False, help="Enter $MFT File (optional).")
+    parser.add_argument("-r", "--mft-rules", default=",".join(DEFAULT_MFT_RULES), help=f"Comma separated SI / FN rules ({', '.join(MFT_RULES)}).")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Number of processes for RCRD page and $MFT parsing.")
+    parser.add_argument("-i", "--incremental", action="store_true", help="Append only records newer than the last run to the existing database.")
+    parser.add_argument("-P", "--pipeline", action="store_true", help="Overlap page reads, parsing and SQLite writes on separate threads.")
+    parser.add_argument("-R", "--reassemble", action="store_true", help="Apply the RCRD fixups and stitch records that run over page boundaries.")
+    parser.add_argument("-b", "--batch-size", type=int, default=INSERT_BATCH_SIZE, help="Records buffered before each SQLite flush.")
+    parser.add_argument("-o", "--output", default=None, help="Output SQLite database (default log_records.db), or the --stream file (default stdout).")
+    parser.add_argument("-s", "--stream", choices=SINK_TYPES, default=None, help="Detect in one pass and write only TimeStomp rows to this sink, without the LogFile table.")
+    parser.add_argument("-D", "--detect-only", action="store_true", help="Keep only the records the timestamp analysis reads, with only their timestamp bytes.")
+    parser.add_argument("-a", "--archive", default=None, help="With --detect-only, also write every record to this database.")
+    parser.add_argument("--flagged-only", action="store_true", help="With --stream, write only rows flagged as time-stomped.")
+    parser.add_argument("--stats", nargs="?", const="summary", choices=("summary", "json"), help="Print per-stage timings and counters (summary or json).")
+    parser.add_argument("--stats-output", default=None, help="Write the --stats report to this file instead of stdout.")
+    parser.add_argument("--profile", default=None, help="Run under cProfile and dump the stats to this file.")
     args = parser.parse_args()
 
+    mft_rules = tuple(rule.strip() for rule in args.mft_rules.split(",") if rule.strip())
+    if not mft_rules or any(rule not in MFT_RULES for rule in mft_rules):
+        parser.error(f"--mft-rules must be a subset of {', '.join(MFT_RULES)}.")
+
+    if args.archive and not args.detect_only:
+        parser.error("--archive is only used with --detect-only.")
+    if args.stream and args.archive:
+        parser.error("--stream does not write an archive.")
+    if args.stream and args.incremental:
+        parser.error("--stream does not support --incremental.")
+    if args.reassemble and args.pipeline:
+        parser.error("--reassemble reads pages through its own window, use it without --pipeline.")
+    if args.stream in ("jsonl", "csv") and args.mft:
+        parser.error("--mft needs a database, use --stream sqlite or no --stream.")
+    output_path = args.output or ("-" if args.stream in ("jsonl", "csv") else "log_records.db")
+    progress = sys.stderr if output_path == "-" else sys.stdout  # Keep stdout clean for the streamed rows.
+
+    stats.enable(args.stats is not None or args.reassemble)  # The recovered records are reported from the counters.
+    profiler = stats.start_profile() if args.profile else None
+
     with open(args.logfile, 'rb') as logfile:
-        log_record_db_path = parse_logfile(logfile, args.logfile)
-        print("[+] LogFile parsing completed successfully.")
+        if args.stream:
+            with stats.stage('stream'):
+                record_batches = iter_log_records(logfile, args.logfile, args.workers, detect_only=True, pipelined=args.pipeline,
+                                                  reassemble=args.reassemble)  # The sinks never see other records.
+                write_to_sink(open_sink(args.stream, output_path), stream_timestomps(record_batches, args.utc, args.flagged_only))
+            log_record_db_path = os.path.abspath(output_path) if args.stream == "sqlite" else None
+            print("[+] LogFile parsing and timestamp analysis completed successfully.", file=progress)
+        else:
+            with stats.stage('logfile'):
+                log_record_db_path = parse_logfile(logfile, args.logfile, args.workers, args.batch_size, args.incremental, output_path,
+                                                   args.detect_only, args.archive, args.pipeline, args.reassemble)
+            print("[+] LogFile parsing completed successfully.")
+
+            with stats.stage('timestomp'):
+                parse_timestomp(log_record_db_path, args.utc)
+            print("[+] Timestamp analysis completed successfully.")
 
-        parse_timestomp(log_record_db_path, args.utc)
-        print("[+] Timestamp analysis completed successfully.")
+        if args.reassemble:
+            print(f"[+] {stats.counters['logfile.recovered_records']} records recovered across page boundaries "
+                  f"({stats.counters['logfile.stitched_records']} stitched, {stats.counters['logfile.torn_pages']} torn pages).", file=progress)
 
         if args.mft and os.path.exists(args.mft):
             with open(args.mft, 'rb') as mftfile:
-                parse_mft(mftfile, args.mft, args.utc, log_record_db_path)
+                with stats.stage('mft'):
+                    parse_mft(mftfile, args.mft, args.utc, log_record_db_path, args.workers, mft_rules)
                 print("[+] MFT parsing completed successfully.")
+
+    if profiler is not None:
+        print(stats.stop_profile(profiler, args.profile), file=sys.stderr)
+    if args.stats:
+        stats.write_report(args.stats, args.stats_output)
@@ -0,0 +1,74 @@
+import io
+import mmap
+
+from structure_print import PAGE_SIZE
+
+class PageSource:
+    def __init__(self, logfile):
+        self.logfile = logfile
+        self.mmap = None
+        self.buffer = None
+        self.view = None
+        self.mapped = False
+        self.base = 0
+        self.loaded_page = None
+
+        try:
+            self.mmap = mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ)
+            self.buffer = self.mmap
+            self.mapped = True
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            if not logfile.seekable():
+                self.buffer = logfile.read()  # Pipes can't seek, keep the whole stream.
+                self.mapped = True
+
+        if self.mapped:
+            self.view = memoryview(self.buffer)
+            self.size = len(self.buffer)
+        else:
+            self.size = logfile.seek(0, io.SEEK_END)
+
+    def load(self, page_number):
+        # Returns the offset of the page inside self.buffer / self.view.
+        if self.mapped:
+            return page_number * PAGE_SIZE
+
+        if self.loaded_page != page_number:
+            self.base = page_number * PAGE_SIZE
+            self.logfile.seek(self.base)
+            self.buffer = self.logfile.read(PAGE_SIZE * 2)  # Record headers may run into the next page.
+            self.view = memoryview(self.buffer)
+            self.loaded_page = page_number
+        return 0
+
+    def slice(self, offset, length):
+        end = offset + length
+        if self.mapped or end <= len(self.buffer):
+            return self.view[offset:end]
+
+        self.logfile.seek(self.base + offset)
+        return self.logfile.read(length)
+
+    def read(self, offset, length):
+        if self.mapped:
+            return self.view[offset:offset + length]
+
+        self.logfile.seek(offset)
+        return self.logfile.read(length)
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        if self.mmap is not None:
+            try:
+                self.mmap.close()
+            except BufferError:  # Still exported by a caller's slice, unmapped once that is freed.
+                pass
+            self.mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,221 @@
+import struct
+import sys
+
+import stats
+from log_record import (
+    find_hex, header_passes_filter, header_reject_reason, detection_bytes, insert_log_record,
+    read_sequence_number_bits, lsn_offset_mask, RECORD_HEADER, RECORD_FILTER
+)
+from structure_print import (
+    RCRD_HEADER_STRUCTURE, RCRDHeader,
+    LogRecordHeader,
+    RECORD_FILTER_OFFSET,
+    PAGE_SIZE,
+    RECORD_HEADER_SIZE
+)
+
+SECTOR_SIZE = 0x200
+FIRST_RCRD_PAGE = 4
+BATCH_PAGES = 64      # Consecutive pages read and fixed up together.
+MAX_RECORD_PAGES = 16  # Following pages a single record may run into.
+
+RCRD_HEADER = struct.Struct(RCRD_HEADER_STRUCTURE)
+UPDATE_SEQUENCE_HEADER = struct.Struct('<HH')  # update_sequence_offset, update_sequence_count
+THIS_LSN = struct.Struct('<Q')
+
+def apply_page_fixups(page_buffer, page_count):
+    # One pass over a batch of pages, returns which pages had every sector tail intact.
+    intact_pages = []
+    for page_offset in range(0, page_count * PAGE_SIZE, PAGE_SIZE):
+        update_sequence_offset, update_sequence_count = UPDATE_SEQUENCE_HEADER.unpack_from(page_buffer, page_offset + 0x04)
+        update_sequence_start = page_offset + update_sequence_offset
+        if update_sequence_count < 2 or update_sequence_offset + update_sequence_count * 2 > SECTOR_SIZE:
+            intact_pages.append(False)
+            continue
+
+        update_sequence_number = page_buffer[update_sequence_start:update_sequence_start + 2]
+        intact = True
+        for sector_index in range(1, min(update_sequence_count, PAGE_SIZE // SECTOR_SIZE + 1)):
+            sector_end = page_offset + sector_index * SECTOR_SIZE - 2
+            if page_buffer[sector_end:sector_end + 2] != update_sequence_number:  # Torn write, this sector keeps its raw bytes.
+                intact = False
+                continue
+            page_buffer[sector_end:sector_end + 2] = page_buffer[update_sequence_start + sector_index * 2:update_sequence_start + sector_index * 2 + 2]
+        intact_pages.append(intact)
+
+    return intact_pages
+
+class PageStream:
+    # Fixed-up RCRD pages held in a small rolling window, records are stitched from it.
+    def __init__(self, source, page_numbers):
+        self.source = source
+        self.page_count = source.size // PAGE_SIZE
+        self.wanted_pages = set(page_numbers)
+        self.pages = {}               # page_number : (page view, RCRDHeader, data_start or None)
+        self.continuation_ends = {}   # page_number : end of the record tail carried over from the previous page
+        self.lsn_offset_mask = lsn_offset_mask(read_sequence_number_bits(source))
+
+    def next_page(self, page_number):
+        return page_number + 1 if page_number + 1 < self.page_count else FIRST_RCRD_PAGE  # Records wrap around the ring too.
+
+    def previous_page(self, page_number):
+        return page_number - 1 if page_number > FIRST_RCRD_PAGE else self.page_count - 1
+
+    def load(self, page_number):
+        batch_count = 1
+        while (batch_count < BATCH_PAGES and page_number + batch_count < self.page_count and
+               page_number + batch_count in self.wanted_pages and page_number + batch_count not in self.pages):
+            batch_count += 1
+
+        with stats.stage('logfile.fixups'):
+            page_buffer = bytearray(self.source.read(page_number * PAGE_SIZE, batch_count * PAGE_SIZE))
+            intact_pages = apply_page_fixups(page_buffer, batch_count)
+
+        view = memoryview(page_buffer)
+        for index, intact in enumerate(intact_pages):
+            page = view[index * PAGE_SIZE:(index + 1) * PAGE_SIZE]
+            rcrd_header = RCRDHeader(*RCRD_HEADER.unpack_from(page))
+            data_start = None
+            if intact and rcrd_header.magic_number.rstrip(b'\x00') == b'RCRD':  # Only intact pages may carry a record tail.
+                data_start = (rcrd_header.update_sequence_offset + rcrd_header.update_sequence_count * 2 + 7) & ~7
+            self.pages[page_number + index] = (page, rcrd_header, data_start)
+
+    def page(self, page_number):
+        if page_number not in self.pages:
+            self.load(page_number)
+        return self.pages[page_number]
+
+    def release(self, page_number):
+        self.pages.pop(page_number, None)
+        self.continuation_ends.pop(page_number, None)
+
+    def read_span(self, page_number, offset, length, this_lsn):
+        # offset counts on from the end of the page into the data area of the following pages.
+        page = self.page(page_number)[0]
+        if offset + length <= PAGE_SIZE:
+            return page[offset:offset + length]
+
+        parts = [page[offset:]] if offset < PAGE_SIZE else []
+        offset = max(offset - PAGE_SIZE, 0)
+        length -= len(parts[0]) if parts else 0
+        for _ in range(MAX_RECORD_PAGES):
+            page_number = self.next_page(page_number)
+            page, rcrd_header, data_start = self.page(page_number)
+            if data_start is None or max(rcrd_header.last_lsn, rcrd_header.last_end_lsn) < this_lsn:  # Overwritten by an older lap.
+                return None
+
+            data_size = PAGE_SIZE - data_start
+            if offset >= data_size:
+                offset -= data_size
+                continue
+            part = page[data_start + offset:data_start + offset + length]
+            parts.append(part)
+            length -= len(part)
+            offset = 0
+            if length == 0:
+                return b''.join(parts)
+
+        return None
+
+    def in_place(self, this_lsn, page_number, record_offset):
+        # A record's LSN is its own file offset / 8, a false candidate in the tail of another record almost never is.
+        return self.lsn_offset_mask is None or (this_lsn & self.lsn_offset_mask) << 3 == page_number * PAGE_SIZE + record_offset
+
+    def mark_continuation(self, page_number, record_end):
+        for _ in range(MAX_RECORD_PAGES):
+            if record_end <= PAGE_SIZE:
+                return
+            page_number = self.next_page(page_number)
+            data_start = self.page(page_number)[2]
+            if data_start is None:
+                return
+            record_end = record_end - PAGE_SIZE + data_start
+            self.continuation_ends[page_number] = max(self.continuation_ends.get(page_number, 0), min(record_end, PAGE_SIZE))
+
+def read_page_records(stream, base_page_number, insert_buffer, detect_only=False):
+    page, rcrd_header, data_start = stream.page(base_page_number)
+    if rcrd_header.magic_number.rstrip(b'\x00') != b'RCRD':
+        sys.exit("Invalid RCRD magic number. Not a valid Restart Page.")
+    if data_start is None:
+        stats.count('logfile.torn_pages')
+
+    next_record_offset = rcrd_header.next_record_offset
+    record_types = [1, 2]  # 0x01 : Update Record, Commit Record / 0x02 : Checkpoint Record
+    searched_records = find_hex(page, record_types, 2, 0, next_record_offset)
+
+    continuation_end = stream.continuation_ends.get(base_page_number, 0)  # Tail of a record stitched from the previous page.
+    searched_records = [x - 0x20 for x in searched_records if x >= 0x30 and x - 0x20 >= continuation_end]
+    stats.count('logfile.pages_visited')
+    stats.count('logfile.candidate_offsets', len(searched_records))
+
+    for record_offset in searched_records:
+        this_lsn, = THIS_LSN.unpack_from(page, record_offset)
+        header = stream.read_span(base_page_number, record_offset, RECORD_HEADER.size, this_lsn)
+        if header is None:
+            stats.count('logfile.rejected.broken_continuation')
+            continue
+
+        reserved, redo_op, undo_op, redo_offset, redo_length, attr_record_offset, attr_offset, cluster_number, page_size = \
+            RECORD_FILTER.unpack_from(header, RECORD_FILTER_OFFSET)
+        if not header_passes_filter(reserved, redo_op, undo_op, redo_offset, redo_length, cluster_number, page_size):
+            if stats.enabled:
+                stats.count(f'logfile.rejected.{header_reject_reason(reserved, redo_op, undo_op, redo_offset, cluster_number, page_size)}')
+            continue
+
+        if detect_only:
+            timestamp_bytes = detection_bytes(redo_op, undo_op, attr_record_offset, attr_offset)
+            if timestamp_bytes is None:
+                if stats.enabled:
+                    stats.count('logfile.skipped_not_candidate')
+                continue
+
+        record_header = LogRecordHeader._make(RECORD_HEADER.unpack_from(header))
+        redo_start = record_offset + RECORD_HEADER_SIZE + record_header.redo_offset
+        undo_start = record_offset + RECORD_HEADER_SIZE + record_header.undo_offset
+        fits_page = (redo_start % PAGE_SIZE) + record_header.redo_length <= next_record_offset  # The check read_record applies.
+        fits_record = (record_header.redo_offset + record_header.redo_length <= record_header.client_data_length and
+                       record_header.undo_offset + record_header.undo_length <= record_header.client_data_length)
+        if not (fits_page or fits_record):
+            stats.count('logfile.rejected.exceeds_page')
+            continue
+        in_place = stream.in_place(record_header.this_lsn, base_page_number, record_offset)
+        if not (fits_page or in_place):  # Only records at their own LSN are read on from the following pages.
+            stats.count('logfile.rejected.lsn_offset')
+            continue
+
+        redo_data = stream.read_span(base_page_number, redo_start, min(record_header.redo_length, timestamp_bytes) if detect_only else record_header.redo_length, record_header.this_lsn)
+        undo_data = stream.read_span(base_page_number, undo_start, min(record_header.undo_length, timestamp_bytes) if detect_only else record_header.undo_length, record_header.this_lsn)
+        if redo_data is None or undo_data is None:
+            stats.count('logfile.rejected.broken_continuation')
+            continue
+
+        record_end = record_offset + RECORD_HEADER_SIZE + record_header.client_data_length
+        if record_end > PAGE_SIZE and fits_record and in_place:
+            stream.mark_continuation(base_page_number, record_end)
+            stats.count('logfile.stitched_records')
+        if not fits_page:
+            stats.count('logfile.recovered_records')  # Dropped by the page-local check of read_record.
+
+        insert_log_record(None, record_header, redo_data, undo_data, insert_buffer)
+
+def parse_pages_reassembled(source, page_numbers, detect_only=False):
+    # Same rows as parse_pages, plus the records running over page boundaries.
+    if not page_numbers:
+        return
+    stream = PageStream(source, page_numbers)
+
+    previous_page = stream.previous_page(page_numbers[0])
+    if stream.page(previous_page)[1].magic_number.rstrip(b'\x00') == b'RCRD':
+        collecting = stats.enabled
+        stats.enable(False)  # The previous page only tells where its last record ends on the first page.
+        try:
+            read_page_records(stream, previous_page, [], detect_only)
+        finally:
+            stats.enable(collecting)
+
+    for base_page_number in page_numbers:
+        insert_buffer = []
+        with stats.stage('logfile.page_scan'):
+            read_page_records(stream, base_page_number, insert_buffer, detect_only)
+        stream.release(stream.previous_page(base_page_number))
+        yield insert_buffer
@@ -3,125 +3,256 @@ import sqlite3
 import struct
 import sys
 import os
-
+import zlib
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy
+except ImportError:  # Optional, read_record gives the same rows one candidate at a time.
+    numpy = None
+
+import page_stream
+import stats
+from log_record import (
+    find_hex, header_passes_filter, header_reject_reason, detection_bytes, insert_log_record, to_sqlite_int,
+    read_sequence_number_bits, RECORD_HEADER, RECORD_FILTER
+)
+from page_source import PageSource
+from pipeline import parse_pages_pipelined
 from structure_print import (
-    read_struct,
+    unpack_struct,
     RSTR_HEADER_STRUCTURE, RSTRHeader, print_rstr_header,
     RCRD_HEADER_STRUCTURE, RCRDHeader, print_rcrd_header,
-    RECORD_HEADER_STRUCTURE, LogRecordHeader, print_log_record_header,
-    OPCODE_MAP,
+    LogRecordHeader, print_log_record_header,
+    RECORD_FILTER_OFFSET,
     PAGE_SIZE,
     RECORD_HEADER_SIZE
 )
 
-def read_rstr_header(logfile, base_page_number):
-    logfile.seek(base_page_number * PAGE_SIZE)
+LSN_SEARCH_CHUNK_SIZE = 0x100000
+INSERT_BATCH_SIZE = 10000
+PAGES_PER_TASK = 256
+SQLITE_CACHE_KIB = 65536
+LOGFILE_SCHEMA_VERSION = 2  # 1 : hex TEXT columns / 2 : native INTEGER and BLOB columns
+
+DECODE_BATCH_PAGES = 64  # Pages whose candidates are decoded together by read_records.
+
+if numpy is not None:
+    from log_record import header_filter_mask, detection_mask, RECORD_HEADER_BYTES, RECORD_HEADER_DTYPE
 
-    rstr_header = read_struct(logfile, RSTR_HEADER_STRUCTURE, RSTRHeader)
+    RECORD_TYPE_SLOTS = numpy.arange(0x30, PAGE_SIZE, 8)  # The aligned slots find_hex matches past the RCRD header.
+
+def read_rstr_header(source, base_page_number):
+    page_offset = source.load(base_page_number)
+
+    rstr_header = unpack_struct(source.buffer, page_offset, RSTR_HEADER_STRUCTURE, RSTRHeader)
 
     if rstr_header.magic_number.rstrip(b'\x00') != b'RSTR':
         sys.exit("Invalid RSTR magic number. Not a valid Restart Page.")
     
     return rstr_header
 
-def search_current_lsn(logfile, base_page_number, current_lsn):
-    logfile.seek(base_page_number * PAGE_SIZE)
+def search_current_lsn(source, base_page_number, current_lsn, sequence_number_bits=0):
+    current_lsn_page = lsn_page_number(source, base_page_number, current_lsn, sequence_number_bits)
+    if current_lsn_page is None:  # Fall back to walking every RCRD header.
+        current_lsn_page = locate_current_lsn_page(source, base_page_number, current_lsn)
+    if current_lsn_page is not None:
+        page_offset = source.load(current_lsn_page)
+        searched_offsets = find_hex(source.buffer, current_lsn, 8, page_offset, page_offset + PAGE_SIZE)
+        if searched_offsets:
+            return [current_lsn_page * PAGE_SIZE + searched_offsets[0]]
+
+    chunk_offset = base_page_number * PAGE_SIZE  # Fall back to a chunked scan that stops at the first hit.
+    while chunk_offset < source.size:
+        if source.mapped:
+            searched_offsets = find_hex(source.buffer, current_lsn, 8, chunk_offset, chunk_offset + LSN_SEARCH_CHUNK_SIZE)
+        else:
+            searched_offsets = find_hex(source.read(chunk_offset, LSN_SEARCH_CHUNK_SIZE), current_lsn, 8)
+
+        if searched_offsets:
+            return [chunk_offset + searched_offsets[0]]
+        chunk_offset += LSN_SEARCH_CHUNK_SIZE
+
+    return []
+
+def lsn_page_number(source, base_page_number, lsn, sequence_number_bits):
+    # The low (64 - sequence_number_bits) bits of an LSN are its file offset / 8, one header read confirms the page.
+    if not 0 < sequence_number_bits < 61:
+        return None
+
+    page_number = ((lsn & ((1 << (64 - sequence_number_bits)) - 1)) << 3) // PAGE_SIZE
+    if not base_page_number <= page_number < source.size // PAGE_SIZE:
+        return None
+
+    page_offset = source.load(page_number)
+    rcrd_header = unpack_struct(source.buffer, page_offset, RCRD_HEADER_STRUCTURE, RCRDHeader)
+    if rcrd_header.magic_number.rstrip(b'\x00') != b'RCRD' or lsn > max(rcrd_header.last_lsn, rcrd_header.last_end_lsn):
+        return None
+    return page_number
+
+def locate_current_lsn_page(source, base_page_number, current_lsn):
+    current_lsn_page = None
+    current_lsn_page_end = None
+
+    for page_number in range(base_page_number, source.size // PAGE_SIZE):
+        page_offset = source.load(page_number)
+        rcrd_header = unpack_struct(source.buffer, page_offset, RCRD_HEADER_STRUCTURE, RCRDHeader)
+        if rcrd_header.magic_number.rstrip(b'\x00') != b'RCRD':
+            continue
 
-    logfile_data = logfile.read()
-    searched_current_lsn = find_hex(logfile_data, current_lsn, 8)
+        page_end_lsn = max(rcrd_header.last_lsn, rcrd_header.last_end_lsn)  # The page holds the records up to its last (end) LSN.
+        if current_lsn <= page_end_lsn and (current_lsn_page_end is None or page_end_lsn < current_lsn_page_end):
+            current_lsn_page = page_number
+            current_lsn_page_end = page_end_lsn
 
-    return searched_current_lsn
+    return current_lsn_page
 
-def read_rcrd_header(logfile, base_page_number):
-    logfile.seek(base_page_number * PAGE_SIZE)
+def read_rcrd_header(source, base_page_number):
+    page_offset = source.load(base_page_number)
 
-    rcrd_header = read_struct(logfile, RCRD_HEADER_STRUCTURE, RCRDHeader)
+    rcrd_header = unpack_struct(source.buffer, page_offset, RCRD_HEADER_STRUCTURE, RCRDHeader)
 
     if rcrd_header.magic_number.rstrip(b'\x00') != b'RCRD':
         sys.exit("Invalid RCRD magic number. Not a valid Restart Page.")
     
     return rcrd_header
 
-def read_record(logfile, base_page_number, insert_buffer, conn):
-    logfile.seek(base_page_number * PAGE_SIZE)
-    rcrd_header = read_rcrd_header(logfile, base_page_number)
-
-    logfile.seek(base_page_number * PAGE_SIZE)
-    logfile_data = logfile.read(rcrd_header.next_record_offset)
+def read_record(source, base_page_number, insert_buffer, conn, detect_only=False):
+    rcrd_header = read_rcrd_header(source, base_page_number)
+    page_offset = source.load(base_page_number)  # Already loaded, the page is sliced in place.
 
     record_types = [1, 2]  # 0x01 : Update Record, Commit Record / 0x02 : Checkpoint Record
-    searched_records = find_hex(logfile_data, record_types, 2)
+    searched_records = find_hex(source.buffer, record_types, 2, page_offset, page_offset + rcrd_header.next_record_offset)
 
     searched_records = [x - 0x20 for x in searched_records if x >= 0x30]  # Skip RCTD header. & Move to start address of Record.
+    stats.count('logfile.pages_visited')
+    stats.count('logfile.candidate_offsets', len(searched_records))
 
+    buffer = source.buffer
+    buffer_size = len(buffer)
+    next_record_offset = rcrd_header.next_record_offset
     for searched_record in searched_records:
-        record_offset = (base_page_number * PAGE_SIZE) + searched_record
-        record_header = read_record_header(record_offset, logfile)
-
-        if (record_header.alignment_or_reserved1 == b'\x00' * len(record_header.alignment_or_reserved1) and  # Condition filter to become a record.
-            record_header.redo_offset == 0x28 and
-            0x00 <= record_header.redo_op <= 0x21 and
-            0x00 <= record_header.undo_op <= 0x21 and
-            record_header.cluster_number in (0x00, 0x02, 0x04, 0x06) and
-            record_header.page_size == 0x02 and
-            record_header.redo_length != 0x00 and 
-            record_header.redo_length != 0x00):
-
-            redo_offset = record_offset + record_header.redo_offset + RECORD_HEADER_SIZE  # Skip Record Header.
-            undo_offset =  record_offset + record_header.undo_offset + RECORD_HEADER_SIZE  # Skip Record Header.
-            if ((redo_offset % PAGE_SIZE) + record_header.redo_length <= rcrd_header.next_record_offset and  # Check if rodo and undo data exceeds the page.
-                (redo_offset % PAGE_SIZE) + record_header.redo_length <= rcrd_header.next_record_offset):
-                logfile.seek(redo_offset)
-                redo_data = logfile.read(record_header.redo_length)
-
-                logfile.seek(undo_offset)
-                undo_data = logfile.read(record_header.undo_length)
-
-                insert_log_record(conn, record_header, redo_data, undo_data, insert_buffer)
+        record_offset = page_offset + searched_record
+        if record_offset + RECORD_HEADER.size > buffer_size:
+            raise EOFError(f"need {RECORD_HEADER.size} bytes, got {max(buffer_size - record_offset, 0)}")
+
+        reserved, redo_op, undo_op, redo_offset, redo_length, attr_record_offset, attr_offset, cluster_number, page_size = \
+            RECORD_FILTER.unpack_from(buffer, record_offset + RECORD_FILTER_OFFSET)  # Only the filtered fields, most candidates stop here.
+        if not header_passes_filter(reserved, redo_op, undo_op, redo_offset, redo_length, cluster_number, page_size):
+            if stats.enabled:  # Only rejected headers pay for the breakdown.
+                stats.count(f'logfile.rejected.{header_reject_reason(reserved, redo_op, undo_op, redo_offset, cluster_number, page_size)}')
+            continue
+
+        if detect_only:  # Detection predicates pushed down, other records are never decoded.
+            timestamp_bytes = detection_bytes(redo_op, undo_op, attr_record_offset, attr_offset)
+            if timestamp_bytes is None:
+                if stats.enabled:
+                    stats.count('logfile.skipped_not_candidate')
+                continue
+
+        record_header = read_record_header(record_offset, source)
+        redo_offset = record_offset + record_header.redo_offset + RECORD_HEADER_SIZE  # Skip Record Header.
+        undo_offset = record_offset + record_header.undo_offset + RECORD_HEADER_SIZE  # Skip Record Header.
+        if (((redo_offset - page_offset) % PAGE_SIZE) + record_header.redo_length <= next_record_offset and  # Check if rodo and undo data exceeds the page.
+            ((redo_offset - page_offset) % PAGE_SIZE) + record_header.redo_length <= next_record_offset):
+            redo_data = source.slice(redo_offset, min(record_header.redo_length, timestamp_bytes) if detect_only else record_header.redo_length)
+            undo_data = source.slice(undo_offset, min(record_header.undo_length, timestamp_bytes) if detect_only else record_header.undo_length)
+
+            insert_log_record(conn, record_header, redo_data, undo_data, insert_buffer)
+        elif stats.enabled:
+            stats.count('logfile.rejected.exceeds_page')
 
     return
 
-def read_record_header(record_offset, logfile):
-    logfile.seek(record_offset)
+def read_records(source, page_numbers, insert_buffer, detect_only=False):
+    # Same rows as read_record page by page, the candidates of all pages are searched, decoded and filtered as NumPy arrays.
+    if numpy is None or not source.mapped:  # Unmapped sources hold one page at a time.
+        for base_page_number in page_numbers:
+            read_record(source, base_page_number, insert_buffer, None, detect_only)
+        return
 
-    record_header = read_struct(logfile, RECORD_HEADER_STRUCTURE, LogRecordHeader)
-    
-    return record_header
+    page_offsets = []
+    next_record_offsets = []
+    for base_page_number in page_numbers:
+        rcrd_header = read_rcrd_header(source, base_page_number)
+        page_offsets.append(source.load(base_page_number))
+        next_record_offsets.append(rcrd_header.next_record_offset)
+    if max(next_record_offsets) > PAGE_SIZE:  # A broken header lets find_hex search on into the next page, keep its exact result.
+        for base_page_number in page_numbers:
+            read_record(source, base_page_number, insert_buffer, None, detect_only)
+        return
 
-def find_hex(logfile_data, search_hexs, byte_size):
-    if not isinstance(search_hexs, list):
-        search_hexs = [search_hexs]
-
-    compiled_patterns = []
-    for pattern in search_hexs:
-        if isinstance(pattern, int):
-            compiled_patterns.append(pattern.to_bytes(byte_size, byteorder='little'))
-        elif isinstance(pattern, bytes):
-            if len(pattern) != byte_size:
-                raise ValueError(f"Byte pattern must be exactly {byte_size} bytes long.")
-            compiled_patterns.append(pattern)
-        else:
-            raise TypeError("Patterns must be int or bytes.")
+    page_offsets = numpy.array(page_offsets, dtype=numpy.int64)
+    next_record_offsets = numpy.array(next_record_offsets, dtype=numpy.int64)
+    slot_words = numpy.frombuffer(source.buffer, dtype='<u2', count=len(source.buffer) // 2)[
+        (page_offsets[:, None] + RECORD_TYPE_SLOTS) // 2]  # A copy, no frame keeps the mmap exported past this line.
+    matches = (((slot_words == 1) | (slot_words == 2)) &  # 0x01 : Update Record, Commit Record / 0x02 : Checkpoint Record
+               (RECORD_TYPE_SLOTS + 2 <= next_record_offsets[:, None]))
+    page_index, slot_index = numpy.nonzero(matches)  # Page order, then offset order, as read_record visits them.
+    stats.count('logfile.pages_visited', len(page_numbers))
+    stats.count('logfile.candidate_offsets', len(page_index))
+    if not len(page_index):
+        return
 
-    matched_offsets = []
-    offset = 0
-    data_len = len(logfile_data)
+    page_offsets = page_offsets[page_index]
+    next_record_offsets = next_record_offsets[page_index]
+    record_offsets = page_offsets + RECORD_TYPE_SLOTS[slot_index] - 0x20  # record_type sits 0x20 into the Record.
+
+    buffer_size = len(source.buffer)
+    if record_offsets.max() + RECORD_HEADER.size > buffer_size:
+        record_offset = int(record_offsets[record_offsets + RECORD_HEADER.size > buffer_size][0])
+        raise EOFError(f"need {RECORD_HEADER.size} bytes, got {max(buffer_size - record_offset, 0)}")
+
+    header_bytes = numpy.frombuffer(source.buffer, dtype=numpy.uint8)[record_offsets[:, None] + RECORD_HEADER_BYTES]
+    headers = header_bytes.view(RECORD_HEADER_DTYPE)[:, 0]  # A copy, the mmap is not kept exported.
+
+    valid = header_filter_mask(header_bytes, headers)
+    if stats.enabled:
+        for header in headers[~valid].tolist():
+            stats.count(f'logfile.rejected.{header_reject_reason(header[8], header[9], header[10], header[11], header[19], header[20])}')
+
+    if detect_only:  # Detection predicates pushed down, other records are never decoded.
+        candidate = detection_mask(headers)
+        if stats.enabled:
+            stats.count('logfile.skipped_not_candidate', int(numpy.count_nonzero(valid & ~candidate)))
+        valid &= candidate
+
+    redo_page_offsets = (record_offsets + headers['redo_offset'] + RECORD_HEADER_SIZE - page_offsets) % PAGE_SIZE
+    fits_page = redo_page_offsets + headers['redo_length'] <= next_record_offsets  # Check if rodo data exceeds the page.
+    if stats.enabled and not fits_page[valid].all():
+        stats.count('logfile.rejected.exceeds_page', int(numpy.count_nonzero(valid & ~fits_page)))
+    valid &= fits_page
+
+    buffer = source.buffer
+    for record_offset in record_offsets[valid].tolist():  # Only the survivors become Python objects, struct beats a structured tolist().
+        record_header = LogRecordHeader._make(RECORD_HEADER.unpack_from(buffer, record_offset))
+        redo_offset = record_offset + record_header.redo_offset + RECORD_HEADER_SIZE  # Skip Record Header.
+        undo_offset = record_offset + record_header.undo_offset + RECORD_HEADER_SIZE  # Skip Record Header.
+        if detect_only:
+            timestamp_bytes = detection_bytes(record_header.redo_op, record_header.undo_op, record_header.record_offset, record_header.attr_offset)
+            redo_data = source.slice(redo_offset, min(record_header.redo_length, timestamp_bytes))
+            undo_data = source.slice(undo_offset, min(record_header.undo_length, timestamp_bytes))
+        else:
+            redo_data = source.slice(redo_offset, record_header.redo_length)
+            undo_data = source.slice(undo_offset, record_header.undo_length)
 
-    while offset + byte_size <= data_len:
-        segment = logfile_data[offset:offset + byte_size]
-        if segment in compiled_patterns:
-            matched_offsets.append(offset)
-        offset += 8
+        insert_log_record(None, record_header, redo_data, undo_data, insert_buffer)
 
-    return sorted(matched_offsets)
+def read_record_header(record_offset, source):
+    record_header = LogRecordHeader._make(RECORD_HEADER.unpack_from(source.buffer, record_offset))
+    
+    return record_header
 
-def init_db(db_path="log_records.db"):
+def init_db(db_path="log_records.db", scratch=True):
     db_path = os.path.abspath(db_path)
     if os.path.exists(db_path):
         os.remove(db_path)
 
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
+    tune_db(conn, scratch)
 
     cursor.execute('''
         CREATE TABLE LogFile (
@@ -130,46 +261,153 @@ def init_db(db_path="log_records.db"):
             record_type INTEGER,
             redo_op_value INTEGER,
             redo_op_name TEXT,
-            redo_data TEXT,
+            redo_data BLOB,
             redo_data_length INTEGER,
             undo_op_value INTEGER,
             undo_op_name TEXT,
-            undo_data TEXT,
+            undo_data BLOB,
             undo_data_length INTEGER,
             target_vcn INTEGER,
             target_lcn INTEGER,
             cluster_number INTEGER,
             record_offset INTEGER,
-            attr_offset INTEGER
+            attr_offset INTEGER,
+            client_undo_lsn INTEGER,
+            transaction_id INTEGER
         )
     ''')
+    create_logfile_hex_view(conn)
+    cursor.execute(f'PRAGMA user_version = {LOGFILE_SCHEMA_VERSION}')
+    init_ingest_state(conn)
     conn.commit()
     return conn, db_path
 
-def insert_log_record(conn, record_header, redo_data: bytes, undo_data: bytes, insert_buffer):
-    insert_buffer.append((
-        f"0x{record_header.this_lsn:X}",
-        f"0x{record_header.previous_lsn:X}",
-        f"0x{record_header.record_type:X}",
-        f"0x{record_header.redo_op:X}",
-        OPCODE_MAP.get(record_header.redo_op, "UNKNOWN"),
-        redo_data.hex(),
-        f"0x{record_header.redo_length:X}",
-        f"0x{record_header.undo_op:X}",
-        OPCODE_MAP.get(record_header.undo_op, "UNKNOWN"),
-        undo_data.hex(),
-        f"0x{record_header.undo_length:X}",
-        f"0x{record_header.target_vcn:X}",
-        f"0x{record_header.target_lcn:X}",
-        f"0x{record_header.cluster_number:X}",
-        f"0x{record_header.record_offset:X}",
-        f"0x{record_header.attr_offset:X}"
-    ))
+def create_logfile_hex_view(conn):
+    cursor = conn.cursor()
+    cursor.execute('DROP VIEW IF EXISTS LogFile_hex')
+    cursor.execute('''
+        CREATE VIEW LogFile_hex AS
+        SELECT
+            printf('0x%X', this_lsn) AS this_lsn,
+            printf('0x%X', previous_lsn) AS previous_lsn,
+            printf('0x%X', record_type) AS record_type,
+            printf('0x%X', redo_op_value) AS redo_op_value,
+            redo_op_name,
+            lower(hex(redo_data)) AS redo_data,
+            printf('0x%X', redo_data_length) AS redo_data_length,
+            printf('0x%X', undo_op_value) AS undo_op_value,
+            undo_op_name,
+            lower(hex(undo_data)) AS undo_data,
+            printf('0x%X', undo_data_length) AS undo_data_length,
+            printf('0x%X', target_vcn) AS target_vcn,
+            printf('0x%X', target_lcn) AS target_lcn,
+            printf('0x%X', cluster_number) AS cluster_number,
+            printf('0x%X', record_offset) AS record_offset,
+            printf('0x%X', attr_offset) AS attr_offset,
+            CASE WHEN client_undo_lsn IS NOT NULL THEN printf('0x%X', client_undo_lsn) END AS client_undo_lsn,
+            CASE WHEN transaction_id IS NOT NULL THEN printf('0x%X', transaction_id) END AS transaction_id  -- NULL on rows of older runs.
+        FROM LogFile
+    ''')
+
+def open_db(db_path="log_records.db", incremental=False):
+    if incremental and os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        if get_schema_version(conn) >= LOGFILE_SCHEMA_VERSION and table_exists(conn, 'LogFile'):  # Older text schemas and --stream sqlite outputs are rebuilt from scratch.
+            tune_db(conn, scratch=False)
+            add_column_if_missing(conn, 'LogFile', 'client_undo_lsn', 'INTEGER')  # Rows of older runs keep NULL.
+            add_column_if_missing(conn, 'LogFile', 'transaction_id', 'INTEGER')
+            create_logfile_hex_view(conn)
+            init_ingest_state(conn)
+            conn.commit()
+            return conn, os.path.abspath(db_path)
+        conn.close()
+
+    return init_db(db_path, scratch=not incremental)
+
+def init_ingest_state(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS IngestState (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PageChecksum (
+            page_number INTEGER PRIMARY KEY,
+            checksum INTEGER
+        )
+    ''')
+
+def get_ingest_state(conn, key, default=None):
+    try:
+        row = conn.execute('SELECT value FROM IngestState WHERE key = ?', (key,)).fetchone()
+    except sqlite3.OperationalError:  # Databases written before IngestState existed.
+        return default
+    return row[0] if row else default
+
+def set_ingest_state(conn, key, value):
+    init_ingest_state(conn)
+    conn.execute('INSERT OR REPLACE INTO IngestState (key, value) VALUES (?, ?)', (key, value))
+
+def select_changed_pages(conn, source, page_numbers, last_ingested_lsn):
+    stored_checksums = array('q', [-1]) * (source.size // PAGE_SIZE)  # One slot per page instead of a dict of tuples.
+    for page_number, checksum in conn.execute('SELECT page_number, checksum FROM PageChecksum'):
+        if page_number < len(stored_checksums):
+            stored_checksums[page_number] = checksum
+
+    changed_pages = []
+    def page_checksums():
+        for page_number in page_numbers:
+            page_data = source.read(page_number * PAGE_SIZE, PAGE_SIZE)  # Only this page, also on unmapped sources.
+            checksum = zlib.crc32(page_data)
+            last_lsn, = struct.unpack_from('<Q', page_data, 0x08)
+            last_end_lsn, = struct.unpack_from('<Q', page_data, 0x20)
+
+            if stored_checksums[page_number] != checksum and (
+                    last_ingested_lsn is None or max(last_lsn, last_end_lsn) > last_ingested_lsn):  # Only pages that can hold newer records.
+                changed_pages.append(page_number)
+            yield page_number, checksum
+
+    # Streamed into the open transaction, committed together with the records.
+    conn.executemany('INSERT OR REPLACE INTO PageChecksum (page_number, checksum) VALUES (?, ?)', page_checksums())
+    return changed_pages
+
+def select_new_records(records, last_ingested_lsn):
+    if last_ingested_lsn is None:
+        return records
+    return [record for record in records if (record[0] & 0xFFFFFFFFFFFFFFFF) > last_ingested_lsn]
+
+def tune_db(conn, scratch=True):
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute(f'PRAGMA synchronous = {"OFF" if scratch else "NORMAL"}')  # A scratch DB is rebuilt on every run.
+    conn.execute(f'PRAGMA cache_size = -{SQLITE_CACHE_KIB}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+
+def create_logfile_indexes(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_logfile_op_offset
+        ON LogFile (redo_op_value, undo_op_value, record_offset, attr_offset)
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logfile_this_lsn ON LogFile (this_lsn)')  # Walks a chain back, one lookup per record.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logfile_previous_lsn ON LogFile (previous_lsn, transaction_id)')  # Walks it forward.
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def table_exists(conn, table_name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone() is not None
+
+def add_column_if_missing(conn, table_name, column_name, column_type):
+    if column_name not in {row[1] for row in conn.execute(f'PRAGMA table_info({table_name})')}:  # Databases written by an older release.
+        conn.execute(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}')
 
 def flush_insert_buffer(conn, insert_buffer):
     if not insert_buffer:
         return
 
+    stats.count('logfile.records_inserted', len(insert_buffer))
     cursor = conn.cursor()
     cursor.executemany('''
         INSERT INTO LogFile (
@@ -177,36 +415,167 @@ def flush_insert_buffer(conn, insert_buffer):
             redo_op_value, redo_op_name, redo_data, redo_data_length,
             undo_op_value, undo_op_name, undo_data, undo_data_length,
             target_vcn, target_lcn, cluster_number,
-            record_offset, attr_offset
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            record_offset, attr_offset,
+            client_undo_lsn, transaction_id
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', insert_buffer)
-    conn.commit()
-    insert_buffer.clear()
+    insert_buffer.clear()  # Rows stay in the open transaction, parse_logfile commits once.
+
+def ring_page_numbers(current_lsn_page, file_size):
+    # From the current LSN page to the end of the file, then around from the first RCRD page.
+    return list(range(current_lsn_page, file_size // PAGE_SIZE)) + list(range(4, current_lsn_page))
+
+def split_page_ranges(page_numbers, workers):
+    range_size = -(-len(page_numbers) // (workers * 4))  # A few ranges per worker to even out the load.
+    range_size = max(1, min(range_size, PAGES_PER_TASK))
+
+    return [page_numbers[start:start + range_size] for start in range(0, len(page_numbers), range_size)]
+
+_worker_source = None
 
-def parse_logfile(logfile, logfile_path):
-    conn, log_record_db_path = init_db()
+def init_page_worker(logfile_path, collect_stats=False):
+    global _worker_source
+    _worker_source = PageSource(open(logfile_path, 'rb'))  # Each worker maps the file itself.
+    stats.enable(collect_stats)
+
+def parse_page_range(page_numbers, detect_only=False, reassemble=False):
+    insert_buffer = []
+    stats.reset()
+    if reassemble:
+        for records in page_stream.parse_pages_reassembled(_worker_source, page_numbers, detect_only):
+            insert_buffer.extend(records)
+    else:
+        with stats.stage('logfile.page_scan'):
+            read_records(_worker_source, page_numbers, insert_buffer, detect_only)
+
+    return insert_buffer, stats.snapshot() if stats.enabled else None  # Worker counters travel back with the rows.
+
+def parse_pages_parallel(logfile_path, page_numbers, workers, detect_only=False, reassemble=False):
+    page_ranges = split_page_ranges(page_numbers, workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_page_worker, initargs=(logfile_path, stats.enabled)) as executor:
+        pending = deque()
+        for page_range in page_ranges:
+            pending.append(executor.submit(parse_page_range, page_range, detect_only, reassemble))
+            if len(pending) >= workers * 2:  # Bound the parsed ranges waiting for the writer.
+                yield collect_page_range(pending.popleft())
+
+        while pending:
+            yield collect_page_range(pending.popleft())  # Ranges come back in the wrap-around order.
+
+def collect_page_range(future):
+    with stats.stage('logfile.worker_wait'):
+        records, worker_stats = future.result()
+    stats.merge(worker_stats)
+    return records
+
+def parse_logfile(logfile, logfile_path, workers=1, batch_size=INSERT_BATCH_SIZE, incremental=False, db_path="log_records.db",
+                  detect_only=False, archive_path=None, pipelined=False, reassemble=False):
+    with stats.stage('logfile.open_db'):
+        conn, log_record_db_path = open_db(db_path, incremental)
+        archive_conn = init_db(archive_path)[0] if archive_path else None
     insert_buffer = []
+    archive_buffer = []
+    pushdown = detect_only and archive_conn is None  # The archive needs every record, detection rows are then cut afterwards.
     base_page_number = 0
-    file_size = os.path.getsize(logfile_path)
+    source = PageSource(logfile)
+    file_size = source.size
+
+    last_ingested_lsn = get_ingest_state(conn, 'last_lsn')
+    if last_ingested_lsn is not None:
+        last_ingested_lsn &= 0xFFFFFFFFFFFFFFFF
+    newest_lsn = last_ingested_lsn
 
-    rstr_header = read_rstr_header(logfile, base_page_number)
+    rstr_header = read_rstr_header(source, base_page_number)
 
     base_page_number = base_page_number + 4  # Skip RSTR, Buffer page.
-    searched_current_lsn = search_current_lsn(logfile, base_page_number, rstr_header.current_lsn)
+    with stats.stage('logfile.search_current_lsn'):
+        searched_current_lsn = search_current_lsn(source, base_page_number, rstr_header.current_lsn, read_sequence_number_bits(source))
 
     for current_lsn_offset in searched_current_lsn:
-        base_page_number = current_lsn_offset // PAGE_SIZE
-        while True:
-            if file_size // PAGE_SIZE <= base_page_number:
-                base_page_number = 4  # Wrap around
+        page_numbers = ring_page_numbers(current_lsn_offset // PAGE_SIZE, file_size)
+        if incremental:  # Full runs parse every page, they need no checksums.
+            with stats.stage('logfile.select_changed_pages'):
+                page_numbers = select_changed_pages(conn, source, page_numbers, last_ingested_lsn)
+
+        page_records = select_page_parser(source, logfile_path, page_numbers, workers, pushdown, pipelined, reassemble)
+        for records in page_records:
+            if archive_conn is not None:
+                archive_buffer.extend(records)
+                if len(archive_buffer) >= batch_size:
+                    with stats.stage('logfile.archive_flush'):
+                        flush_insert_buffer(archive_conn, archive_buffer)
+                if detect_only:
+                    records = select_detection_records(records)
+
+            records = select_new_records(records, last_ingested_lsn)
+            for record in records:
+                record_lsn = record[0] & 0xFFFFFFFFFFFFFFFF
+                if newest_lsn is None or record_lsn > newest_lsn:
+                    newest_lsn = record_lsn
+
+            insert_buffer.extend(records)
+            if len(insert_buffer) >= batch_size:
+                with stats.stage('logfile.sqlite_flush'):
+                    flush_insert_buffer(conn, insert_buffer)
 
-            read_record(logfile, base_page_number, insert_buffer, conn)
-            base_page_number = base_page_number + 1
-
-            if base_page_number == current_lsn_offset // PAGE_SIZE:
-                break
         break  # 현재는 하나의 current_lsn만 처리
 
-    flush_insert_buffer(conn, insert_buffer)
+    with stats.stage('logfile.sqlite_flush'):
+        flush_insert_buffer(conn, insert_buffer)
+    if newest_lsn is not None:
+        set_ingest_state(conn, 'last_lsn', to_sqlite_int(newest_lsn))
+    with stats.stage('logfile.create_indexes'):
+        create_logfile_indexes(conn)  # Building the indexes once after the load beats updating them per row.
+    with stats.stage('logfile.commit'):
+        conn.commit()
     conn.close()
+
+    if archive_conn is not None:
+        with stats.stage('logfile.archive_flush'):
+            flush_insert_buffer(archive_conn, archive_buffer)
+            create_logfile_indexes(archive_conn)
+            archive_conn.commit()
+        archive_conn.close()
+    source.close()
     return log_record_db_path
+
+def select_detection_records(records):
+    selected = []
+    for record in records:  # Same predicate and truncation as the pushdown in read_record.
+        timestamp_bytes = detection_bytes(record[3], record[7], record[14], record[15])
+        if timestamp_bytes is not None:
+            selected.append((*record[:5], record[5][:timestamp_bytes], *record[6:9], record[9][:timestamp_bytes], *record[10:]))
+    return selected
+
+def iter_log_records(logfile, logfile_path, workers=1, detect_only=False, pipelined=False, reassemble=False):
+    # Same page walk as parse_logfile, but the rows are yielded instead of stored.
+    source = PageSource(logfile)
+    try:
+        rstr_header = read_rstr_header(source, 0)
+        with stats.stage('logfile.search_current_lsn'):
+            searched_current_lsn = search_current_lsn(source, 4, rstr_header.current_lsn, read_sequence_number_bits(source))  # Skip RSTR, Buffer page.
+
+        for current_lsn_offset in searched_current_lsn[:1]:
+            page_numbers = ring_page_numbers(current_lsn_offset // PAGE_SIZE, source.size)
+            page_records = select_page_parser(source, logfile_path, page_numbers, workers, detect_only, pipelined, reassemble)
+            for records in page_records:
+                stats.count('logfile.records_parsed', len(records))
+                yield records
+    finally:
+        source.close()
+
+def select_page_parser(source, logfile_path, page_numbers, workers=1, detect_only=False, pipelined=False, reassemble=False):
+    if pipelined and not reassemble and os.path.isfile(logfile_path):
+        return parse_pages_pipelined(logfile_path, page_numbers, read_records, workers, detect_only)
+    if workers > 1 and os.path.isfile(logfile_path):
+        return parse_pages_parallel(logfile_path, page_numbers, workers, detect_only, reassemble)
+    if reassemble:
+        return page_stream.parse_pages_reassembled(source, page_numbers, detect_only)  # Fixed-up pages, records stitched across pages.
+    return parse_pages(source, page_numbers, detect_only)
+
+def parse_pages(source, page_numbers, detect_only=False):
+    for start in range(0, len(page_numbers), DECODE_BATCH_PAGES):
+        insert_buffer = []
+        with stats.stage('logfile.page_scan'):
+            read_records(source, page_numbers[start:start + DECODE_BATCH_PAGES], insert_buffer, detect_only)
+        yield insert_buffer
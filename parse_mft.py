@@ -1,15 +1,61 @@
 import sqlite3
+import struct
 import os
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 
+try:
+    import numpy
+except ImportError:  # Optional, the array('Q') path gives the same results.
+    numpy = None
+
+import stats
+from page_source import PageSource
+from log_record import to_sqlite_int
+from parse_logfile import add_column_if_missing, table_exists
+from parse_timestamp import link_timestomp_to_mft, materialize_confirmed_timestomp
 from structure_print import (
-    read_struct, convert_windows_timestamp,
-    ATTRIBUTE_HEADER_STRUCTURE, AttributeHeader,
-    SI_FN_TIME_STRUCTURE, SIFNTime,
-    MFT_ENTRY_HEADER, MFTEntryHeader,
-    MFT_ENTRY_HEADER_SIZE,
-    MFT_ENTRY_SIZE
+    filetime_to_string,
+    FILETIME_TICKS_PER_SECOND,
+    SI_FN_TIME_STRUCTURE,
+    MFT_ENTRY_SIZE,
+    CLUSTER_SIZE
 )
 
+SECTOR_SIZE = 0x200
+ATTRIBUTE_HEADER_SIZE = 0x18
+ENTRIES_PER_TASK = 0x4000
+ROOT_ENTRY = 5
+NO_PARENT = 0xFFFFFFFFFFFFFFFF
+ORPHAN_PATH = '\\$Orphan'
+MAX_PATH_DEPTH = 1024
+DIRECTORY_CACHE_SIZE = 0x40000
+
+ENTRY_PREFIX = struct.Struct('<I12xH2xHH')  # signature, sequence_number (0x10), first_attr_offset (0x14), flags (0x16)
+FIXUP_HEADER = struct.Struct('<HH')  # fixup_array_offset, fixup_entry_count
+ATTRIBUTE_PREFIX = struct.Struct('<IIB')  # attr_type, attr_length, resident_flag
+RESIDENT_CONTENT = struct.Struct('<IH')  # content_size, content_offset
+SI_FN_TIMES = struct.Struct(SI_FN_TIME_STRUCTURE)
+PARENT_REFERENCE = struct.Struct('<Q')
+FILE_NAME_LENGTH = struct.Struct('<BB')  # name_length, namespace
+
+MFT_RULES = ('si_newer', 'si_before_fn', 'si_zero_fraction')
+DEFAULT_MFT_RULES = ('si_newer',)
+
+RULE_CHECKS = {
+    'si_newer': lambda si, fn: si[0] > fn[0] and si[1] > fn[1] and si[2] > fn[2] and si[3] > fn[3],  # Every SI time after its FN time.
+    'si_before_fn': lambda si, fn: si[0] < fn[0],  # SI created before the FN record was written.
+    'si_zero_fraction': lambda si, fn: si[0] != 0 and si[0] % FILETIME_TICKS_PER_SECOND == 0 and si[1] % FILETIME_TICKS_PER_SECOND == 0,  # Whole-second SI created / modified.
+}
+
+NUMPY_RULE_MASKS = {
+    'si_newer': lambda si, fn: (si > fn).all(axis=1),
+    'si_before_fn': lambda si, fn: si[:, 0] < fn[:, 0],
+    'si_zero_fraction': lambda si, fn: (si[:, 0] != 0) & ((si[:, :2] % FILETIME_TICKS_PER_SECOND) == 0).all(axis=1),
+}
+
 def init_si_fn_db(conn):
     cursor = conn.cursor()
     cursor.execute('''
@@ -23,11 +69,54 @@ def init_si_fn_db(conn):
             fn_modified_time TEXT,
             fn_mft_modified_time TEXT,
             fn_last_access_time TEXT,
-            is_timestomped BOOLEAN
+            is_timestomped BOOLEAN,
+            full_path TEXT,
+            si_create_filetime INTEGER,
+            si_modified_filetime INTEGER,
+            si_mft_modified_filetime INTEGER,
+            si_last_access_filetime INTEGER,
+            fn_create_filetime INTEGER,
+            fn_modified_filetime INTEGER,
+            fn_mft_modified_filetime INTEGER,
+            fn_last_access_filetime INTEGER,
+            si_newer BOOLEAN,
+            si_before_fn BOOLEAN,
+            si_zero_fraction BOOLEAN
         )
     ''')
+    add_column_if_missing(conn, 'si_fn', 'full_path', 'TEXT')
+    cursor.execute('DELETE FROM si_fn')  # si_fn is a snapshot of the current $MFT, also on incremental runs.
+    cursor.execute('DROP TABLE IF EXISTS Timeline')  # Stale with the new snapshot, main.py query rebuilds it on first use.
+    conn.commit()
+
+def init_entry_map_db(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS MFTEntryMap (
+            target_vcn INTEGER,
+            cluster_number INTEGER,
+            mft_entry INTEGER,
+            sequence_number INTEGER,
+            PRIMARY KEY (target_vcn, cluster_number)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('DELETE FROM MFTEntryMap')  # Rebuilt from the current $MFT like si_fn.
     conn.commit()
 
+def insert_entry_map(conn, mapped_entries, mapped_sequences, cluster_size=CLUSTER_SIZE):
+    conn.executemany('''
+        INSERT OR REPLACE INTO MFTEntryMap (target_vcn, cluster_number, mft_entry, sequence_number)
+        VALUES (?, ?, ?, ?)
+    ''', (
+        (
+            mft_entry * MFT_ENTRY_SIZE // cluster_size,  # LogFile addresses an entry by its $MFT cluster (VCN)
+            mft_entry * MFT_ENTRY_SIZE % cluster_size // SECTOR_SIZE,  # and the 512-byte block inside that cluster.
+            mft_entry,
+            sequence_number
+        )
+        for mft_entry, sequence_number in zip(mapped_entries, mapped_sequences)
+    ))
+
 def insert_buffered_records(conn, buffer):
     if not buffer:
         return
@@ -44,76 +133,343 @@ def insert_buffered_records(conn, buffer):
             fn_modified_time,
             fn_mft_modified_time,
             fn_last_access_time,
-            is_timestomped
+            is_timestomped,
+            si_create_filetime,
+            si_modified_filetime,
+            si_mft_modified_filetime,
+            si_last_access_filetime,
+            fn_create_filetime,
+            fn_modified_filetime,
+            fn_mft_modified_filetime,
+            fn_last_access_filetime,
+            si_newer,
+            si_before_fn,
+            si_zero_fraction
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', buffer)
     conn.commit()
 
 
-def parse_mft(mftfile, mftfile_path, utc_offset, log_record_db_path):
+def apply_fixups(entry_buffer, entry_offset):
+    fixup_array_offset, fixup_entry_count = FIXUP_HEADER.unpack_from(entry_buffer, entry_offset + 0x04)
+    fixup_start = entry_offset + fixup_array_offset
+    if fixup_entry_count < 2 or fixup_start + fixup_entry_count * 2 > entry_offset + MFT_ENTRY_SIZE:
+        return False
+
+    update_sequence_number = entry_buffer[fixup_start:fixup_start + 2]
+    for sector_index in range(1, min(fixup_entry_count, MFT_ENTRY_SIZE // SECTOR_SIZE + 1)):
+        sector_end = entry_offset + sector_index * SECTOR_SIZE - 2
+        if entry_buffer[sector_end:sector_end + 2] != update_sequence_number:  # Torn write, the entry can't be trusted.
+            return False
+        entry_buffer[sector_end:sector_end + 2] = entry_buffer[fixup_start + sector_index * 2:fixup_start + sector_index * 2 + 2]
+
+    return True
+
+def read_si_fn_times(entry_buffer, entry_offset, first_attr_offset):
+    si_times = None
+    fn_times = None
+    parent_ref = NO_PARENT
+    entry_end = entry_offset + MFT_ENTRY_SIZE
+    attr_offset = entry_offset + first_attr_offset
+
+    while attr_offset + ATTRIBUTE_HEADER_SIZE <= entry_end:  # Walk the attribute chain, whatever the order.
+        attr_type, attr_length, non_resident_flag = ATTRIBUTE_PREFIX.unpack_from(entry_buffer, attr_offset)
+        if attr_type == 0xFFFFFFFF or attr_length < ATTRIBUTE_HEADER_SIZE or attr_offset + attr_length > entry_end:
+            break
+
+        if non_resident_flag == 0x00 and attr_type in (0x10, 0x30):
+            content_size, content_offset = RESIDENT_CONTENT.unpack_from(entry_buffer, attr_offset + 0x10)
+            content_start = attr_offset + content_offset
+            if attr_type == 0x10 and si_times is None and content_start + 0x20 <= entry_end:
+                si_times = SI_FN_TIMES.unpack_from(entry_buffer, content_start)
+            elif attr_type == 0x30 and fn_times is None and content_start + 0x28 <= entry_end:
+                parent_ref, = PARENT_REFERENCE.unpack_from(entry_buffer, content_start)
+                fn_times = SI_FN_TIMES.unpack_from(entry_buffer, content_start + 0x08)  # Skip parent reference.
+
+        if si_times is not None and fn_times is not None:
+            break
+        attr_offset += attr_length
+
+    return si_times, fn_times, parent_ref
+
+def read_file_name(entry_buffer, entry_offset, first_attr_offset):
+    file_name = None
+    entry_end = entry_offset + MFT_ENTRY_SIZE
+    attr_offset = entry_offset + first_attr_offset
+
+    while attr_offset + ATTRIBUTE_HEADER_SIZE <= entry_end:
+        attr_type, attr_length, non_resident_flag = ATTRIBUTE_PREFIX.unpack_from(entry_buffer, attr_offset)
+        if attr_type == 0xFFFFFFFF or attr_length < ATTRIBUTE_HEADER_SIZE or attr_offset + attr_length > entry_end:
+            break
+
+        if attr_type == 0x30 and non_resident_flag == 0x00:
+            content_size, content_offset = RESIDENT_CONTENT.unpack_from(entry_buffer, attr_offset + 0x10)
+            name_start = attr_offset + content_offset + 0x42
+            if name_start <= entry_end:
+                name_length, namespace = FILE_NAME_LENGTH.unpack_from(entry_buffer, name_start - 2)
+                name = bytes(entry_buffer[name_start:min(name_start + name_length * 2, entry_end)]).decode('utf-16-le', errors='replace')
+                if namespace != 0x02:  # Prefer the long (POSIX / Win32) name over the DOS 8.3 one.
+                    return name
+                file_name = name
+
+        attr_offset += attr_length
+
+    return file_name
+
+def read_entry_file_name(source, mft_entry):
+    entry_buffer = bytearray(source.read(mft_entry * MFT_ENTRY_SIZE, MFT_ENTRY_SIZE))
+    if len(entry_buffer) < MFT_ENTRY_SIZE:
+        return None
+
+    signature, sequence_number, first_attr_offset, flags = ENTRY_PREFIX.unpack_from(entry_buffer, 0)
+    if signature != 0x454C4946 or not apply_fixups(entry_buffer, 0):
+        return None
+    return read_file_name(entry_buffer, 0, first_attr_offset)
+
+def scan_mft_entries(source, first_entry, last_entry):
+    entry_buffer = bytearray(source.read(first_entry * MFT_ENTRY_SIZE, (last_entry - first_entry) * MFT_ENTRY_SIZE))  # One copy per chunk for the fixups.
+
+    entry_numbers = array('Q')
+    si_columns = array('Q')  # 4 FILETIMEs per entry, in on-disk order.
+    fn_columns = array('Q')
+    mapped_entries = array('Q')  # Every in-use entry, for MFTEntryMap.
+    mapped_sequences = array('H')
+    parent_refs = array('Q', [NO_PARENT]) * (last_entry - first_entry)  # One slot per entry in the range.
+    directory_names = {}
+    for entry_index in range(len(entry_buffer) // MFT_ENTRY_SIZE):
+        entry_offset = entry_index * MFT_ENTRY_SIZE
+        signature, sequence_number, first_attr_offset, flags = ENTRY_PREFIX.unpack_from(entry_buffer, entry_offset)
+        if signature != 0x454C4946 or not flags & 0x01:  # FILE, MTF Entry in useed
+            continue
+        if not apply_fixups(entry_buffer, entry_offset):
+            continue
+
+        mapped_entries.append(first_entry + entry_index)
+        mapped_sequences.append(sequence_number)
+
+        si_times, fn_times, parent_ref = read_si_fn_times(entry_buffer, entry_offset, first_attr_offset)
+        parent_refs[entry_index] = parent_ref
+        if flags & 0x02:  # Directory, its name is needed for every path below it.
+            directory_names[first_entry + entry_index] = read_file_name(entry_buffer, entry_offset, first_attr_offset)
+
+        if si_times is None or fn_times is None:
+            continue
+
+        entry_numbers.append(first_entry + entry_index)
+        si_columns.extend(si_times)
+        fn_columns.extend(fn_times)
+
+    return entry_numbers, si_columns, fn_columns, mapped_entries, mapped_sequences, parent_refs, directory_names
+
+def compute_rule_masks(si_columns, fn_columns, rules):
+    if numpy is not None:
+        si = numpy.frombuffer(si_columns, dtype=numpy.uint64).reshape(-1, 4)
+        fn = numpy.frombuffer(fn_columns, dtype=numpy.uint64).reshape(-1, 4)
+        return numpy.array([NUMPY_RULE_MASKS[rule](si, fn) for rule in rules], dtype=bool).reshape(len(rules), len(si))
+
+    si_rows = list(zip(*[iter(si_columns)] * 4))
+    fn_rows = list(zip(*[iter(fn_columns)] * 4))
+    return [list(map(RULE_CHECKS[rule], si_rows, fn_rows)) for rule in rules]
+
+def detect_si_fn(entry_numbers, si_columns, fn_columns, rules):
+    rule_masks = compute_rule_masks(si_columns, fn_columns, rules)
+    if numpy is not None:  # Only the flagged entries reach Python.
+        flagged_indexes = numpy.flatnonzero(rule_masks.any(axis=0))
+        flagged_rules = zip(flagged_indexes.tolist(), map(tuple, rule_masks[:, flagged_indexes].T.tolist()))
+    else:
+        flagged_rules = ((entry_index, rule_flags) for entry_index, rule_flags in enumerate(zip(*rule_masks)) if any(rule_flags))
+
+    flagged_entries = []
+    for entry_index, rule_flags in flagged_rules:
+        flagged_entries.append((
+            entry_numbers[entry_index],
+            tuple(si_columns[entry_index * 4:entry_index * 4 + 4]),
+            tuple(fn_columns[entry_index * 4:entry_index * 4 + 4]),
+            rule_flags
+        ))
+
+    return flagged_entries
+
+@dataclass
+class MFTChunk:
+    # One scan_and_detect range, returned in-process or from a scan_mft_range worker.
+    flagged_entries: list
+    mapped_entries: object
+    mapped_sequences: object
+    parent_refs: object
+    directory_names: dict
+
+def scan_and_detect(source, first_entry, last_entry, rules):
+    entry_numbers, si_columns, fn_columns, mapped_entries, mapped_sequences, parent_refs, directory_names = \
+        scan_mft_entries(source, first_entry, last_entry)
+
+    return MFTChunk(
+        detect_si_fn(entry_numbers, si_columns, fn_columns, rules),
+        mapped_entries, mapped_sequences, parent_refs, directory_names
+    )
+
+class MFTPathResolver:
+    def __init__(self, source, parent_refs, sequence_numbers, directory_names):
+        self.source = source
+        self.parent_refs = parent_refs
+        self.sequence_numbers = sequence_numbers
+        self.directory_names = directory_names
+        self.directory_paths = OrderedDict()  # LRU of resolved directory paths.
+
+    def parent_entry(self, mft_entry):
+        parent_ref = self.parent_refs[mft_entry] if mft_entry < len(self.parent_refs) else NO_PARENT
+        if parent_ref == NO_PARENT:
+            return None
+
+        parent_entry = parent_ref & 0xFFFFFFFFFFFF
+        parent_sequence = parent_ref >> 48
+        if parent_entry >= len(self.sequence_numbers) or (parent_sequence and self.sequence_numbers[parent_entry] != parent_sequence):
+            return None  # Parent slot was reused, the entry is an orphan.
+        return parent_entry
+
+    def directory_path(self, mft_entry):
+        unresolved = []
+        current_entry = mft_entry
+        while current_entry not in self.directory_paths:
+            if current_entry == ROOT_ENTRY:
+                self.directory_paths[ROOT_ENTRY] = ''
+                break
+
+            parent_entry = self.parent_entry(current_entry)
+            if parent_entry is None or current_entry in unresolved or len(unresolved) >= MAX_PATH_DEPTH:
+                self.directory_paths[current_entry] = ORPHAN_PATH
+                break
+
+            unresolved.append(current_entry)
+            current_entry = parent_entry
+
+        path = self.directory_paths[current_entry]
+        self.directory_paths.move_to_end(current_entry)
+        for directory_entry in reversed(unresolved):
+            path = f"{path}\\{self.directory_names.get(directory_entry) or f'$Entry{directory_entry}'}"
+            self.directory_paths[directory_entry] = path
+
+        while len(self.directory_paths) > DIRECTORY_CACHE_SIZE:
+            self.directory_paths.popitem(last=False)
+        return path
+
+    def resolve(self, mft_entry):
+        if mft_entry == ROOT_ENTRY:
+            return '\\'
+
+        file_name = self.directory_names.get(mft_entry) or read_entry_file_name(self.source, mft_entry)
+        if file_name is None:
+            return None
+
+        parent_entry = self.parent_entry(mft_entry)
+        parent_path = self.directory_path(parent_entry) if parent_entry is not None else ORPHAN_PATH
+        return f"{parent_path}\\{file_name}"
+
+def store_full_paths(conn, resolver):
+    # Only flagged entries are resolved, si_fn holds just those and unflagged TimeStomp rows keep a NULL path.
+    cursor = conn.cursor()
+    full_paths = {}
+    for table_name, flagged in (('si_fn', ''), ('TimeStomp', ' AND is_timestomped = 1')):  # idx_timestomp_flagged_entry
+        if not table_exists(conn, table_name):
+            continue
+
+        mft_entries = [row[0] for row in cursor.execute(f'SELECT DISTINCT mft_entry FROM {table_name} WHERE mft_entry IS NOT NULL{flagged}')]
+        for mft_entry in mft_entries:
+            if mft_entry not in full_paths:
+                full_paths[mft_entry] = resolver.resolve(mft_entry)
+        cursor.executemany(
+            f'UPDATE {table_name} SET full_path = ? WHERE mft_entry = ?{flagged}',
+            ((full_paths[mft_entry], mft_entry) for mft_entry in mft_entries)
+        )
+    stats.count('mft.paths_resolved', len(full_paths))
+
+_worker_source = None
+
+def init_mft_worker(mftfile_path):
+    global _worker_source
+    _worker_source = PageSource(open(mftfile_path, 'rb'))  # Each worker maps the file itself.
+
+def scan_mft_range(entry_range, rules):
+    return scan_and_detect(_worker_source, *entry_range, rules)
+
+def split_entry_ranges(entry_count, workers):
+    range_size = max(1, min(ENTRIES_PER_TASK, -(-entry_count // (workers * 4))))
+    return [(first_entry, min(first_entry + range_size, entry_count)) for first_entry in range(0, entry_count, range_size)]
+
+def scan_mft(source, mftfile_path, workers=1, rules=DEFAULT_MFT_RULES):
+    entry_ranges = split_entry_ranges(source.size // MFT_ENTRY_SIZE, workers)
+
+    if workers > 1 and os.path.isfile(mftfile_path):
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_mft_worker, initargs=(mftfile_path,)) as executor:
+            yield from timed_chunks(executor.map(scan_mft_range, entry_ranges, [rules] * len(entry_ranges)))
+    else:
+        yield from timed_chunks(scan_and_detect(source, first_entry, last_entry, rules) for first_entry, last_entry in entry_ranges)
+
+def timed_chunks(mft_chunks):
+    while True:
+        with stats.stage('mft.scan'):  # Scan time in this process, or the wait for the workers.
+            mft_chunk = next(mft_chunks, None)
+        if mft_chunk is None:
+            return
+
+        stats.count('mft.entries_scanned', len(mft_chunk.parent_refs))
+        stats.count('mft.entries_in_use', len(mft_chunk.mapped_entries))
+        stats.count('mft.rows_flagged', len(mft_chunk.flagged_entries))
+        yield mft_chunk
+
+def parse_mft(mftfile, mftfile_path, utc_offset, log_record_db_path, workers=1, rules=DEFAULT_MFT_RULES, cluster_size=CLUSTER_SIZE):
     conn = sqlite3.connect(log_record_db_path)
+    source = PageSource(mftfile)
     try:
         init_si_fn_db(conn)
+        init_entry_map_db(conn)
 
         buffer = []
         buffer_limit = 100000
 
-        max_number_of_mft_entry = os.path.getsize(mftfile_path) // MFT_ENTRY_SIZE
-        current_mft_entry = 0
-
-        while current_mft_entry < max_number_of_mft_entry:
-            mftfile.seek(current_mft_entry * MFT_ENTRY_SIZE)
-            mft_entry_header = read_struct(mftfile, MFT_ENTRY_HEADER, MFTEntryHeader)  # Address of STANDARD_INFORMATION
-            if mft_entry_header.signature == 0x454C4946 and mft_entry_header.flags & 0x01:  # MTF Entry in useed
-                si_attribute_header = read_struct(mftfile, ATTRIBUTE_HEADER_STRUCTURE, AttributeHeader)
-                if (si_attribute_header.attr_type == 0x10):
-                    if si_attribute_header.resident_flag == 0x00:
-                        si_times = read_struct(mftfile, SI_FN_TIME_STRUCTURE, SIFNTime)
-                    elif si_attribute_header.resident_flag == 0x40:
-                        mftfile.seek(0x28, 1)
-                        si_times = read_struct(mftfile, SI_FN_TIME_STRUCTURE, SIFNTime)
-
-                mftfile.seek(current_mft_entry * MFT_ENTRY_SIZE + MFT_ENTRY_HEADER_SIZE + si_attribute_header.attr_length)  # Address of FILE_NAME
-                fn_attribute_header = read_struct(mftfile, ATTRIBUTE_HEADER_STRUCTURE, AttributeHeader)
-                if (fn_attribute_header.attr_type == 0x30):
-                    if fn_attribute_header.resident_flag == 0x00:
-                        mftfile.seek(0x08, 1)
-                        fn_times = read_struct(mftfile, SI_FN_TIME_STRUCTURE, SIFNTime)
-                    elif fn_attribute_header.resident_flag == 0x40:
-                        mftfile.seek(0x30, 1)
-                        fn_times = read_struct(mftfile, SI_FN_TIME_STRUCTURE, SIFNTime)
-
-                is_si_newer = (
-                    si_times.creation_time     > fn_times.creation_time and
-                    si_times.mft_modified_time > fn_times.mft_modified_time and
-                    si_times.modified_time     > fn_times.modified_time and
-                    si_times.access_time       > fn_times.access_time
+        entry_count = source.size // MFT_ENTRY_SIZE
+        parent_refs = array('Q')
+        sequence_numbers = array('H', bytes(2 * entry_count))
+        directory_names = {}
+
+        for mft_chunk in scan_mft(source, mftfile_path, workers, rules):
+            with stats.stage('mft.insert'):
+                insert_entry_map(conn, mft_chunk.mapped_entries, mft_chunk.mapped_sequences, cluster_size)
+            parent_refs.extend(mft_chunk.parent_refs)  # Chunks arrive in entry order.
+            for mft_entry, sequence_number in zip(mft_chunk.mapped_entries, mft_chunk.mapped_sequences):
+                sequence_numbers[mft_entry] = sequence_number
+            directory_names.update(mft_chunk.directory_names)
+
+            for mft_entry, si_times, fn_times, rule_flags in mft_chunk.flagged_entries:
+                filetimes = (
+                    si_times[0], si_times[2], si_times[1], si_times[3],  # Same column order as the SIFNTime fields before.
+                    fn_times[0], fn_times[2], fn_times[1], fn_times[3]
                 )
+                buffer.append((
+                    mft_entry,
+                    *(filetime_to_string(filetime, utc_offset) for filetime in filetimes),
+                    True,
+                    *(to_sqlite_int(filetime) for filetime in filetimes),
+                    *(bool(rule_flags[rules.index(rule)]) if rule in rules else None for rule in MFT_RULES)
+                ))
+
+            if len(buffer) >= buffer_limit:
+                with stats.stage('mft.insert'):
+                    insert_buffered_records(conn, buffer)
+                buffer = []
 
-                if is_si_newer:
-                    record = (
-                        current_mft_entry,
-                        convert_windows_timestamp(si_times.creation_time.to_bytes(8, 'little').hex(), utc=utc_offset),
-                        convert_windows_timestamp(si_times.modified_time.to_bytes(8, 'little').hex(), utc=utc_offset),
-                        convert_windows_timestamp(si_times.mft_modified_time.to_bytes(8, 'little').hex(), utc=utc_offset),
-                        convert_windows_timestamp(si_times.access_time.to_bytes(8, 'little').hex(), utc=utc_offset),
-                        convert_windows_timestamp(fn_times.creation_time.to_bytes(8, 'little').hex(), utc=utc_offset),
-                        convert_windows_timestamp(fn_times.modified_time.to_bytes(8, 'little').hex(), utc=utc_offset),
-                        convert_windows_timestamp(fn_times.mft_modified_time.to_bytes(8, 'little').hex(), utc=utc_offset),
-                        convert_windows_timestamp(fn_times.access_time.to_bytes(8, 'little').hex(), utc=utc_offset),
-                        True
-                    )
-                    buffer.append(record)
-
-                    if len(buffer) >= buffer_limit:
-                        insert_buffered_records(conn, buffer)
-                        buffer = []
-
-            current_mft_entry += 1
-
-        insert_buffered_records(conn, buffer)
+        with stats.stage('mft.insert'):
+            insert_buffered_records(conn, buffer)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_si_fn_mft_entry ON si_fn (mft_entry)')
+        with stats.stage('mft.link_timestomp'):
+            link_timestomp_to_mft(conn, materialize=False)
+        with stats.stage('mft.resolve_paths'):
+            store_full_paths(conn, MFTPathResolver(source, parent_refs, sequence_numbers, directory_names))
+        with stats.stage('mft.confirm_timestomp'):
+            materialize_confirmed_timestomp(conn)
+            conn.commit()
 
     finally:
         conn.close()
-    
\ No newline at end of file
+        source.close()
@@ -1,6 +1,56 @@
 import sqlite3
+import struct
+from functools import lru_cache
 
-from structure_print import convert_windows_timestamp
+try:
+    import numpy
+except ImportError:  # Optional, rows are decoded one by one without it.
+    numpy = None
+
+import stats
+from log_record import detection_bytes, to_sqlite_int, TIMESTAMP_RECORDS
+from parse_logfile import add_column_if_missing, get_schema_version, INSERT_BATCH_SIZE, get_ingest_state, set_ingest_state, table_exists
+from structure_print import filetime_to_string, filetime_date_prefix, utc_offset_seconds, FILETIME_DAY_RANGE, FILETIME_TICKS_PER_SECOND
+
+FILETIME_STRUCTS = [struct.Struct(f'<{count}Q') for count in range(5)]
+
+SI_FIELD_MAP = {
+    0x18: [0, 1, 2, 3],       # Created, Modified, MFT-Modified, Last-Access
+    0x20: [1, 2, 3],          # Modified, MFT-Modified, Last-Access
+    0x28: [2, 3],             # MFT-Modified, Last-Access
+    0x30: [3],                # Last-Access
+}
+
+FN_FIELD_MAP = {
+    0x18: [0, 1, 2, 3],  # Created, Modified, MFT-Modified, Last-Access (skip first 8 bytes)
+    0x20: [0, 1, 2, 3],  # All 4 timestamps
+    0x28: [1, 2, 3],     # Modified, MFT-Modified, Last-Access
+    0x30: [2, 3],        # MFT-Modified, Last-Access
+    0x38: [3],           # Last-Access
+}
+
+TIMESTOMP_COLUMNS = (
+    'this_lsn',
+    'undo_create_time', 'undo_modified_time', 'undo_mft_modified_time', 'undo_last_access_time',
+    'redo_create_time', 'redo_modified_time', 'redo_mft_modified_time', 'redo_last_access_time',
+    'is_timestomped', 'attr_name',
+    'target_vcn', 'cluster_number', 'record_offset', 'attr_offset',
+    'undo_create_filetime', 'undo_modified_filetime', 'undo_mft_modified_filetime', 'undo_last_access_filetime',
+    'redo_create_filetime', 'redo_modified_filetime', 'redo_mft_modified_filetime', 'redo_last_access_filetime'
+)  # Columns of the rows built by detect_timestomps.
+
+SI_RECORD_OFFSET = 0x38
+FN_RECORD_OFFSET = 0x98
+TIMESTAMP_ATTRS = {  # record_offset : (attr_name, field map)
+    SI_RECORD_OFFSET: ('STANDARD_INFORMATION', SI_FIELD_MAP),
+    FN_RECORD_OFFSET: ('FILE_NAME', FN_FIELD_MAP),
+}
+DECODE_PLANS = {  # (record_offset, attr_offset) : (attr_name, field positions, first timestamp byte), one lookup per row.
+    (record_offset, attr_offset): (TIMESTAMP_ATTRS[record_offset][0], TIMESTAMP_ATTRS[record_offset][1][attr_offset],
+                                   8 if record_offset == FN_RECORD_OFFSET and attr_offset == 0x18 else 0)
+    for record_offset, attr_offsets in TIMESTAMP_RECORDS.items()  # The same rows the parser keeps with --detect-only.
+    for attr_offset in attr_offsets
+}  # FILE_NAME at 0x18 starts with the File Reference Address.
 
 def init_timestomp_db(conn):
     cursor = conn.cursor()
@@ -20,118 +70,279 @@ def init_timestomp_db(conn):
             target_vcn INTEGER,
             cluster_number INTEGER,
             record_offset INTEGER,
-            attr_offset INTEGER
+            attr_offset INTEGER,
+            undo_create_filetime INTEGER,
+            undo_modified_filetime INTEGER,
+            undo_mft_modified_filetime INTEGER,
+            undo_last_access_filetime INTEGER,
+            redo_create_filetime INTEGER,
+            redo_modified_filetime INTEGER,
+            redo_mft_modified_filetime INTEGER,
+            redo_last_access_filetime INTEGER,
+            mft_entry INTEGER,
+            mft_sequence INTEGER,
+            full_path TEXT
         )
     ''')
-    conn.commit()
-
-def process_and_insert(conn, rows, utc_offset, attr):
-    cursor = conn.cursor()
-    for this_lsn, redo_hex, undo_hex, target_vcn, cluster_number, record_offset, attr_offset in rows:
-        try:
-            offset = int(attr_offset, 16)
-        except ValueError:
-            continue
-        
-        if attr == 'STANDARD_INFORMATION':
-            undo_times = extract_timestamps_standard_information(undo_hex, offset, utc_offset)
-            redo_times = extract_timestamps_standard_information(redo_hex, offset, utc_offset)
-        elif attr == 'FILE_NAME':
-            undo_times = extract_timestamps_file_name(undo_hex, offset, utc_offset)
-            redo_times = extract_timestamps_file_name(redo_hex, offset, utc_offset)            
-
-        is_timestomped = any(
-            undo and redo and undo > redo
-            for undo, redo in zip(undo_times, redo_times)
-        )
-
+    add_column_if_missing(conn, 'TimeStomp', 'full_path', 'TEXT')
+    cursor.execute('DROP TABLE IF EXISTS Timeline')  # Stale once TimeStomp changes, main.py query rebuilds it on first use.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestomp_vcn_cluster ON TimeStomp (target_vcn, cluster_number)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestomp_flagged_entry ON TimeStomp (mft_entry) WHERE is_timestomped = 1')
+    if get_schema_version(conn) >= 2:
         cursor.execute('''
-            INSERT INTO TimeStomp (
-                this_lsn,
+            CREATE VIEW IF NOT EXISTS TimeStomp_hex AS
+            SELECT
+                printf('0x%X', this_lsn) AS this_lsn,
                 undo_create_time, undo_modified_time, undo_mft_modified_time, undo_last_access_time,
                 redo_create_time, redo_modified_time, redo_mft_modified_time, redo_last_access_time,
                 is_timestomped, attr_name,
-                target_vcn, cluster_number, record_offset, attr_offset
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+                printf('0x%X', target_vcn) AS target_vcn,
+                printf('0x%X', cluster_number) AS cluster_number,
+                printf('0x%X', record_offset) AS record_offset,
+                printf('0x%X', attr_offset) AS attr_offset,
+                undo_create_filetime, undo_modified_filetime, undo_mft_modified_filetime, undo_last_access_filetime,
+                redo_create_filetime, redo_modified_filetime, redo_mft_modified_filetime, redo_last_access_filetime,
+                mft_entry, mft_sequence, full_path
+            FROM TimeStomp
+        ''')
+    conn.commit()
+
+def process_and_insert(conn, rows, utc_offset):
+    with stats.stage('timestomp.decode'):
+        records = detect_timestomps(rows, utc_offset)
+    if stats.enabled:
+        stats.count('timestomp.rows_analysed', len(records))
+        stats.count('timestomp.rows_flagged', sum(1 for record in records if record[9]))  # is_timestomped
+
+    with stats.stage('timestomp.insert'):
+        insert_timestomps(conn, records)
+
+def insert_timestomps(conn, records):
+    cursor = conn.cursor()
+    cursor.executemany(f'''
+        INSERT INTO TimeStomp ({", ".join(TIMESTOMP_COLUMNS)})
+        VALUES ({", ".join("?" * len(TIMESTOMP_COLUMNS))})
+    ''', records)
+
+def detect_timestomps(rows, utc_offset):
+    # SI and FN rows in one pass, each row is dispatched on its (record_offset, attr_offset).
+    if numpy is not None and rows:
+        return detect_timestomp_columns(rows, utc_offset)
+
+    records = []
+    for this_lsn, redo_data, undo_data, target_vcn, cluster_number, record_offset, attr_offset, record_key, attr_key in rows:
+        attr, positions, start_byte = DECODE_PLANS[(record_key, attr_key)]
+        count = len(positions)
+        undo_filetimes = [None] * 4
+        redo_filetimes = [None] * 4
+        is_timestomped = False
+
+        for field_idx, undo, redo in zip(positions, unpack_filetimes(undo_data, start_byte, count), unpack_filetimes(redo_data, start_byte, count)):
+            undo_filetimes[field_idx] = undo
+            redo_filetimes[field_idx] = redo
+            if (not is_timestomped and redo and undo is not None and
+                    undo // FILETIME_TICKS_PER_SECOND > redo // FILETIME_TICKS_PER_SECOND and  # Same 1-second resolution as the text columns.
+                    filetime_to_string(undo, utc_offset) and filetime_to_string(redo, utc_offset)):  # Both inside the datetime range.
+                is_timestomped = True
+
+        times = [filetime_to_string(filetime, utc_offset) for filetime in (*undo_filetimes, *redo_filetimes)]
+        records.append((
             this_lsn,
-            *(t if t else None for t in undo_times),
-            *(t if t else None for t in redo_times),
+            *times,
             is_timestomped, attr,
-            target_vcn, cluster_number, record_offset, attr_offset
+            target_vcn, cluster_number, record_offset, attr_offset,
+            *(filetime if filetime is None else to_sqlite_int(filetime) for filetime in undo_filetimes),
+            *(filetime if filetime is None else to_sqlite_int(filetime) for filetime in redo_filetimes)
         ))
-    conn.commit()
 
-def fetch_relevant_rows_standard_information(conn):
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT this_lsn, redo_data, undo_data, target_vcn, cluster_number, record_offset, attr_offset
-        FROM LogFile
-        WHERE record_offset = "0x38"
-        AND redo_op_value = "0x7"
-        AND undo_op_value = "0x7"
-        AND attr_offset IN ("0x18", "0x20", "0x28", "0x30")
-    ''')
-    return cursor.fetchall()
+    return records
+
+def detect_timestomp_columns(rows, utc_offset):
+    # Same records as the row loop, each (record_offset, attr_offset) group is decoded as FILETIME columns.
+    this_lsns, redo_blobs, undo_blobs, target_vcns, cluster_numbers, record_offsets, attr_offsets, record_keys, attr_keys = zip(*rows)
+    row_count = len(rows)
+    filetimes = numpy.zeros((row_count, 8), dtype=numpy.uint64)  # undo_* then redo_*, in TIMESTOMP_COLUMNS order.
+    present = numpy.zeros((row_count, 8), dtype=bool)
+    attrs = numpy.empty(row_count, dtype=object)
+
+    plan_keys = numpy.array(record_keys, dtype=numpy.int64) << 16 | numpy.array(attr_keys, dtype=numpy.int64)
+    for (record_key, attr_key), (attr, positions, start_byte) in DECODE_PLANS.items():
+        attrs[plan_keys == (record_key << 16 | attr_key)] = attr
+    unpack_filetime_columns(undo_blobs, plan_keys, filetimes, present, 0)
+    unpack_filetime_columns(redo_blobs, plan_keys, filetimes, present, 4)
+
+    seconds = (filetimes // FILETIME_TICKS_PER_SECOND).astype(numpy.int64)  # Same 1-second resolution as the text columns.
+    days = (seconds + utc_offset_seconds(utc_offset)) // 86400
+    renders = (filetimes != 0) & (days >= FILETIME_DAY_RANGE[0]) & (days <= FILETIME_DAY_RANGE[1])  # filetime_to_string is not None.
+    is_timestomped = (renders[:, :4] & renders[:, 4:] & (seconds[:, :4] > seconds[:, 4:])).any(axis=1)
+
+    times = numpy.full((row_count, 8), None, dtype=object)  # Missing fields are 0 here and stay None.
+    unique_days, day_indexes = numpy.unique(days[renders], return_inverse=True)
+    dates = numpy.array([f'{filetime_date_prefix(day)} ' for day in unique_days.tolist()], dtype=str)
+    clock = (seconds[renders] + utc_offset_seconds(utc_offset)) % 86400
+    times[renders] = numpy.char.add(dates[day_indexes.ravel()], clock_texts()[clock]).astype(object)  # Same text as filetime_to_string.
+
+    sqlite_filetimes = filetimes.view(numpy.int64).astype(object)  # to_sqlite_int
+    sqlite_filetimes[~present] = None
+    return list(zip(
+        this_lsns,
+        *times.T.tolist(),
+        is_timestomped.tolist(), attrs.tolist(),
+        target_vcns, cluster_numbers, record_offsets, attr_offsets,
+        *sqlite_filetimes.T.tolist()
+    ))
+
+@lru_cache(maxsize=None)
+def clock_texts():
+    return numpy.array([f'{hours:02d}:{minutes:02d}:{seconds:02d}' for hours in range(24) for minutes in range(60) for seconds in range(60)])
 
-def fetch_relevant_rows_file_name(conn):
+def unpack_filetime_columns(blobs, plan_keys, filetimes, present, first_column):
+    # Blobs of one (record_offset, attr_offset) and length are joined as they are and read as one 2-D array.
+    lengths = numpy.fromiter(map(len, blobs), dtype=numpy.int64, count=len(blobs))
+    group_keys = plan_keys << 16 | lengths  # redo_length / undo_length are 16-bit.
+    for group_key in numpy.unique(group_keys).tolist():
+        attr, positions, start_byte = DECODE_PLANS[(group_key >> 32, group_key >> 16 & 0xFFFF)]
+        length = group_key & 0xFFFF
+        available = max(0, min(len(positions), (length - start_byte) // 8))  # A truncated blob only yields its complete fields.
+        if not available:
+            continue
+
+        row_indexes = numpy.flatnonzero(group_keys == group_key)
+        data = numpy.frombuffer(b''.join([blobs[index] for index in row_indexes.tolist()]), dtype=numpy.uint8).reshape(-1, length)
+        columns = [first_column + field_idx for field_idx in positions[:available]]
+        filetimes[row_indexes[:, None], columns] = data[:, start_byte:start_byte + 8 * available].copy().view('<u8')
+        present[row_indexes[:, None], columns] = True
+
+def unpack_filetimes(data: bytes, start_byte: int, count: int):
+    available = max(0, min(count, (len(data) - start_byte) // 8))  # A truncated blob only yields its complete fields.
+    filetimes = FILETIME_STRUCTS[available].unpack_from(data, start_byte) if available else ()  # Shorter than the File Reference Address too.
+    return filetimes + (None,) * (count - available)
+
+def relevant_rows_predicate(literal):
+    predicates = []
+    for record_offset, attrs in TIMESTAMP_RECORDS.items():
+        attr_offsets = ", ".join(literal(attr_offset) for attr_offset in attrs)
+        predicates.append(f'(record_offset = {literal(record_offset)} AND attr_offset IN ({attr_offsets}))')
+    return ' OR '.join(predicates)
+
+def iter_relevant_rows(conn, after_rowid=0, batch_size=INSERT_BATCH_SIZE):
+    # STANDARD_INFORMATION and FILE_NAME rows in one scan, in LogFile order, batch_size rows at a time.
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT this_lsn, redo_data, undo_data, target_vcn, cluster_number, record_offset, attr_offset
-        FROM LogFile
-        WHERE record_offset = "0x98"
-        AND redo_op_value = "0x7"
-        AND undo_op_value = "0x7"
-        AND attr_offset IN ("0x18", "0x20", "0x28", "0x30", "0x38")
-    ''')
-    return cursor.fetchall()
+    typed = get_schema_version(conn) >= 2
+    if typed:  # Typed schema, integer predicates hit idx_logfile_op_offset.
+        cursor.execute(f'''
+            SELECT this_lsn, redo_data, undo_data, target_vcn, cluster_number, record_offset, attr_offset, record_offset, attr_offset
+            FROM LogFile
+            WHERE redo_op_value = 7
+            AND undo_op_value = 7
+            AND ({relevant_rows_predicate(str)})
+            AND rowid > ?
+            ORDER BY rowid
+        ''', (after_rowid,))
+    else:
+        cursor.execute(f'''
+            SELECT this_lsn, redo_data, undo_data, target_vcn, cluster_number, record_offset, attr_offset
+            FROM LogFile
+            WHERE redo_op_value = "0x7"
+            AND undo_op_value = "0x7"
+            AND ({relevant_rows_predicate(lambda value: f"'0x{value:X}'")})
+            AND rowid > ?
+            ORDER BY rowid
+        ''', (after_rowid,))
 
-def extract_timestamps_standard_information(data_hex: str, attr_offset: int, utc: int):
-    times = [None] * 4
+    while True:
+        with stats.stage('timestomp.fetch'):
+            rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows if typed else decode_hex_rows(rows)
 
-    field_map = {
-        0x18: [0, 1, 2, 3],       # Created, Modified, MFT-Modified, Last-Access
-        0x20: [1, 2, 3],          # Modified, MFT-Modified, Last-Access
-        0x28: [2, 3],             # MFT-Modified, Last-Access
-        0x30: [3],                # Last-Access
-    }
+def decode_hex_rows(hex_rows):
+    rows = []
+    for this_lsn, redo_hex, undo_hex, target_vcn, cluster_number, record_offset, attr_offset in hex_rows:
+        try:
+            rows.append((this_lsn, bytes.fromhex(redo_hex), bytes.fromhex(undo_hex),
+                         target_vcn, cluster_number, record_offset, attr_offset, int(record_offset, 16), int(attr_offset, 16)))
+        except ValueError:
+            continue
+    return rows
 
-    positions = field_map.get(attr_offset, [])
-    for i, field_idx in enumerate(positions):
-        hex_str = data_hex[i * 16:(i + 1) * 16]
-        times[field_idx] = convert_windows_timestamp(hex_str, utc)
+def select_relevant_records(records):
+    # Same predicate as iter_relevant_rows, applied to LogFile rows before they reach SQLite.
+    return [
+        (record[0], record[5], record[9], record[11], record[13], record[14], record[15], record[14], record[15])
+        for record in records
+        if detection_bytes(record[3], record[7], record[14], record[15]) is not None
+    ]
 
-    return times
+def stream_timestomps(record_batches, utc_offset, only_flagged=False):
+    for records in record_batches:
+        rows = select_relevant_records(records)
+        if not rows:
+            continue
 
-def extract_timestamps_file_name(data_hex: str, attr_offset: int, utc: int):
-    times = [None] * 4
+        with stats.stage('timestomp.decode'):
+            timestomps = detect_timestomps(rows, utc_offset)
+        if only_flagged:
+            timestomps = [timestomp for timestomp in timestomps if timestomp[9]]  # is_timestomped
+        if stats.enabled:
+            stats.count('timestomp.rows_analysed', len(rows))
+            stats.count('timestomp.rows_flagged', sum(1 for timestomp in timestomps if timestomp[9]))
+        yield timestomps
 
-    field_map = {
-        0x18: [0, 1, 2, 3],  # Created, Modified, MFT-Modified, Last-Access (skip first 8 bytes)
-        0x20: [0, 1, 2, 3],  # All 4 timestamps
-        0x28: [1, 2, 3],     # Modified, MFT-Modified, Last-Access
-        0x30: [2, 3],        # MFT-Modified, Last-Access
-        0x38: [3],           # Last-Access
-    }
+def link_timestomp_to_mft(conn, only_unlinked=False, materialize=True):
+    if get_schema_version(conn) < 2 or not table_exists(conn, 'MFTEntryMap'):
+        return
 
-    positions = field_map.get(attr_offset, [])
-    start_byte = 8 if attr_offset == 0x18 else 0  # Skip File Reference Address.
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        UPDATE TimeStomp
+        SET (mft_entry, mft_sequence) = (
+            SELECT mft_entry, sequence_number
+            FROM MFTEntryMap
+            WHERE MFTEntryMap.target_vcn = TimeStomp.target_vcn
+            AND MFTEntryMap.cluster_number = TimeStomp.cluster_number
+        )
+        {"WHERE mft_entry IS NULL" if only_unlinked else ""}
+    ''')
+
+    if materialize:
+        materialize_confirmed_timestomp(conn)
 
-    for i, field_idx in enumerate(positions):
-        hex_start = (start_byte + i * 8) * 2
-        hex_str = data_hex[hex_start:hex_start + 16]
-        times[field_idx] = convert_windows_timestamp(hex_str, utc)
+def materialize_confirmed_timestomp(conn):
+    if get_schema_version(conn) < 2 or not table_exists(conn, 'si_fn'):
+        return
 
-    return times
+    cursor = conn.cursor()
+    cursor.execute('DROP TABLE IF EXISTS ConfirmedTimeStomp')
+    cursor.execute('''
+        CREATE TABLE ConfirmedTimeStomp AS
+        SELECT
+            t.this_lsn, t.mft_entry, t.mft_sequence, s.full_path, t.attr_name,
+            t.target_vcn, t.cluster_number, t.record_offset, t.attr_offset,
+            t.undo_create_time, t.undo_modified_time, t.undo_mft_modified_time, t.undo_last_access_time,
+            t.redo_create_time, t.redo_modified_time, t.redo_mft_modified_time, t.redo_last_access_time,
+            s.si_create_time, s.si_modified_time, s.si_mft_modified_time, s.si_last_access_time,
+            s.fn_create_time, s.fn_modified_time, s.fn_mft_modified_time, s.fn_last_access_time
+        FROM TimeStomp AS t
+        JOIN si_fn AS s ON s.mft_entry = t.mft_entry
+        WHERE t.is_timestomped = 1
+        AND t.mft_entry IS NOT NULL
+    ''')
 
 def parse_timestomp(log_record_db_path, utc_offset):
     conn = sqlite3.connect(log_record_db_path)
     try:
         init_timestomp_db(conn)
-        rows = fetch_relevant_rows_standard_information(conn)
-        process_and_insert(conn, rows, utc_offset, 'STANDARD_INFORMATION')
+        after_rowid = get_ingest_state(conn, 'timestomp_rowid', 0)  # Incremental runs only analyse the new LogFile rows.
+        last_rowid = conn.execute('SELECT max(rowid) FROM LogFile').fetchone()[0] or 0
+
+        for rows in iter_relevant_rows(conn, after_rowid):  # STANDARD_INFORMATION and FILE_NAME together.
+            process_and_insert(conn, rows, utc_offset)
 
-        # rows = fetch_relevant_rows_file_name(conn)
-        # process_and_insert(conn, rows, utc_offset, 'FILE_NAME')
+        with stats.stage('timestomp.link_mft'):
+            link_timestomp_to_mft(conn, only_unlinked=True)  # Uses the entry map of an earlier $MFT pass, if any.
+        set_ingest_state(conn, 'timestomp_rowid', last_rowid)
+        conn.commit()
     finally:
         conn.close()
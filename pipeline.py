@@ -0,0 +1,137 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import stats
+from structure_print import PAGE_SIZE
+
+READAHEAD_PAGES = 64  # Pages per batch handed from the reader to the parser.
+QUEUE_DEPTH = 8       # Batches the reader may run ahead of the parser.
+PUT_TIMEOUT = 0.1
+
+class PageBatch:
+    # A run of consecutive pages read ahead into memory, with the same interface as PageSource.
+    def __init__(self, first_page, buffer):
+        self.first_page = first_page
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.size = len(buffer)
+        self.mapped = True
+
+    def load(self, page_number):
+        return (page_number - self.first_page) * PAGE_SIZE
+
+    def slice(self, offset, length):
+        end = offset + length
+        if end <= len(self.buffer):
+            return self.view[offset:end]
+        return read_at(self.first_page * PAGE_SIZE + offset, length)  # Data running past the read-ahead.
+
+    def read(self, offset, length):
+        return self.slice(offset, length)
+
+_batch_file = None
+_batch_lock = threading.Lock()
+
+def init_batch_worker(logfile_path, collect_stats=False):
+    global _batch_file
+    _batch_file = open(logfile_path, 'rb')
+    stats.enable(collect_stats)
+
+def close_batch_file():
+    global _batch_file
+    if _batch_file is not None:
+        _batch_file.close()
+        _batch_file = None
+
+def read_at(offset, length):
+    with _batch_lock:
+        _batch_file.seek(offset)
+        return _batch_file.read(length)
+
+def contiguous_batches(page_numbers, batch_pages):
+    batch = []
+    for page_number in page_numbers:
+        if batch and (page_number != batch[-1] + 1 or len(batch) >= batch_pages):  # Split at the ring wrap.
+            yield batch
+            batch = []
+        batch.append(page_number)
+    if batch:
+        yield batch
+
+def put_until_stopped(batch_queue, item, stop):
+    while not stop.is_set():
+        try:
+            batch_queue.put(item, timeout=PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def read_page_batches(logfile_path, page_numbers, batch_pages, batch_queue, stop):
+    try:
+        with open(logfile_path, 'rb') as logfile:  # Own handle, file reads release the GIL.
+            for batch in contiguous_batches(page_numbers, batch_pages):
+                with stats.stage('logfile.read_ahead'):
+                    logfile.seek(batch[0] * PAGE_SIZE)
+                    buffer = logfile.read((len(batch) + 1) * PAGE_SIZE)  # One more page for records running into the next page.
+                if not put_until_stopped(batch_queue, (batch[0], batch, buffer), stop):
+                    return
+        put_until_stopped(batch_queue, None, stop)
+    except BaseException as error:
+        put_until_stopped(batch_queue, error, stop)
+
+def parse_page_batch(read_records, first_page, page_numbers, buffer, detect_only=False, in_worker=False):
+    source = PageBatch(first_page, buffer)
+    insert_buffer = []
+    if in_worker:
+        stats.reset()
+    with stats.stage('logfile.page_scan'):
+        read_records(source, page_numbers, insert_buffer, detect_only)
+
+    return insert_buffer, stats.snapshot() if in_worker and stats.enabled else None
+
+def collect_page_batch(future):
+    with stats.stage('logfile.parser_wait'):
+        records, worker_stats = future.result()
+    stats.merge(worker_stats)
+    return records
+
+def parse_pages_pipelined(logfile_path, page_numbers, read_records, workers=1, detect_only=False,
+                          batch_pages=READAHEAD_PAGES, queue_depth=QUEUE_DEPTH):
+    # reader thread -> parser (thread, or processes with workers > 1) -> caller, who writes to SQLite.
+    # read_records is parse_logfile's page parser, handed in so this module does not import it back.
+    batch_queue = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    reader = threading.Thread(target=read_page_batches, args=(logfile_path, page_numbers, batch_pages, batch_queue, stop), daemon=True)
+
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_batch_worker, initargs=(logfile_path, stats.enabled))
+    else:
+        init_batch_worker(logfile_path, stats.enabled)
+        executor = ThreadPoolExecutor(max_workers=1)
+
+    reader.start()
+    try:
+        with executor:
+            pending = deque()
+            while True:
+                with stats.stage('logfile.reader_wait'):
+                    batch = batch_queue.get()
+                if batch is None:
+                    break
+                if isinstance(batch, BaseException):
+                    raise batch
+
+                pending.append(executor.submit(parse_page_batch, read_records, *batch, detect_only, workers > 1))
+                if len(pending) >= max(2, workers * 2):  # Bound the parsed batches waiting for the writer.
+                    yield collect_page_batch(pending.popleft())
+
+            while pending:
+                yield collect_page_batch(pending.popleft())
+    finally:
+        stop.set()
+        reader.join()
+        if workers <= 1:
+            close_batch_file()
@@ -0,0 +1,70 @@
+import csv
+import json
+import os
+import sqlite3
+import sys
+
+from parse_logfile import tune_db, LOGFILE_SCHEMA_VERSION
+from parse_timestamp import init_timestomp_db, insert_timestomps, TIMESTOMP_COLUMNS
+
+SINK_TYPES = ('sqlite', 'jsonl', 'csv')
+
+class SQLiteSink:
+    def __init__(self, db_path):
+        self.db_path = os.path.abspath(db_path)
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+        self.conn = sqlite3.connect(self.db_path)
+        tune_db(self.conn, scratch=True)
+        self.conn.execute(f'PRAGMA user_version = {LOGFILE_SCHEMA_VERSION}')  # Typed TimeStomp rows, same as a full run.
+        init_timestomp_db(self.conn)
+
+    def write(self, records):
+        insert_timestomps(self.conn, records)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+class JSONLSink:
+    def __init__(self, output_path='-'):
+        self.output = sys.stdout if output_path == '-' else open(output_path, 'w')
+
+    def write(self, records):
+        self.output.writelines(json.dumps(dict(zip(TIMESTOMP_COLUMNS, record))) + "\n" for record in records)
+        self.output.flush()  # Let the consumer see each batch as soon as it is detected.
+
+    def close(self):
+        if self.output is not sys.stdout:
+            self.output.close()
+
+class CSVSink:
+    def __init__(self, output_path='-'):
+        self.output = sys.stdout if output_path == '-' else open(output_path, 'w', newline='')
+        self.writer = csv.writer(self.output)
+        self.writer.writerow(TIMESTOMP_COLUMNS)
+
+    def write(self, records):
+        self.writer.writerows(records)
+        self.output.flush()
+
+    def close(self):
+        if self.output is not sys.stdout:
+            self.output.close()
+
+def open_sink(sink_type, output_path):
+    if sink_type == 'sqlite':
+        return SQLiteSink(output_path)
+    if sink_type == 'jsonl':
+        return JSONLSink(output_path)
+    if sink_type == 'csv':
+        return CSVSink(output_path)
+    raise ValueError(f"Unknown sink: {sink_type} ({', '.join(SINK_TYPES)}).")
+
+def write_to_sink(sink, record_batches):
+    try:
+        for records in record_batches:
+            sink.write(records)
+    finally:
+        sink.close()
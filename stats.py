@@ -0,0 +1,116 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+from collections import Counter
+
+try:
+    import resource
+except ImportError:  # Not available on Windows, peak memory is then reported as None.
+    resource = None
+
+enabled = False
+counters = Counter()
+stage_times = {}  # name : [wall_seconds, cpu_seconds, calls]
+
+class Stage:
+    __slots__ = ('name', 'wall_started', 'cpu_started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if enabled:
+            self.wall_started = time.perf_counter()
+            self.cpu_started = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if enabled:
+            add_stage_time(self.name, time.perf_counter() - self.wall_started, time.process_time() - self.cpu_started)
+        return False
+
+def enable(collect=True):
+    global enabled
+    enabled = collect
+
+def reset():
+    counters.clear()
+    stage_times.clear()
+
+def stage(name):
+    return Stage(name)
+
+def count(name, value=1):
+    if enabled:
+        counters[name] += value
+
+def add_stage_time(name, wall_seconds, cpu_seconds, calls=1):
+    times = stage_times.setdefault(name, [0.0, 0.0, 0])
+    times[0] += wall_seconds
+    times[1] += cpu_seconds
+    times[2] += calls
+
+def snapshot():
+    return {'counters': dict(counters), 'stages': {name: list(times) for name, times in stage_times.items()}}
+
+def merge(worker_snapshot):
+    if not enabled or not worker_snapshot:
+        return
+    counters.update(worker_snapshot['counters'])
+    for name, (wall_seconds, cpu_seconds, calls) in worker_snapshot['stages'].items():
+        add_stage_time(name, wall_seconds, cpu_seconds, calls)
+
+def peak_memory_kib():
+    if resource is None:
+        return None, None
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,  # KiB on Linux.
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+def report():
+    peak_self_kib, peak_children_kib = peak_memory_kib()
+    return {
+        'stages': {
+            name: {'wall_seconds': round(wall_seconds, 6), 'cpu_seconds': round(cpu_seconds, 6), 'calls': calls}
+            for name, (wall_seconds, cpu_seconds, calls) in stage_times.items()
+        },
+        'counters': dict(sorted(counters.items())),
+        'peak_rss_kib': peak_self_kib,
+        'peak_worker_rss_kib': peak_children_kib,
+    }
+
+def format_summary(run_report):
+    lines = ["[+] Stage timings", f"    {'stage':<32} {'wall (s)':>10} {'cpu (s)':>10} {'calls':>10}"]
+    for name, times in run_report['stages'].items():
+        lines.append(f"    {name:<32} {times['wall_seconds']:>10.3f} {times['cpu_seconds']:>10.3f} {times['calls']:>10}")
+
+    lines.append("[+] Counters")
+    for name, value in run_report['counters'].items():
+        lines.append(f"    {name:<43} {value:>21}")
+
+    if run_report['peak_rss_kib'] is not None:
+        lines.append(f"[+] Peak RSS : {run_report['peak_rss_kib'] // 1024} MiB (workers {run_report['peak_worker_rss_kib'] // 1024} MiB)")
+    return "\n".join(lines)
+
+def write_report(stats_format, output_path=None):
+    run_report = report()
+    text = json.dumps(run_report, indent=2) if stats_format == 'json' else format_summary(run_report)
+    if output_path:
+        with open(output_path, 'w') as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+def start_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def stop_profile(profiler, output_path, limit=25):
+    profiler.disable()
+    profiler.dump_stats(output_path)  # Open with `python -m pstats` or snakeviz.
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(limit)
+    return summary.getvalue()
@@ -1,11 +1,14 @@
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass
+from functools import lru_cache
+from typing import NamedTuple
 import struct
 
 PAGE_SIZE = 0x1000
 RECORD_HEADER_SIZE = 0x30
 MFT_ENTRY_SIZE = 0x400
 MFT_ENTRY_HEADER_SIZE = 0x38
+CLUSTER_SIZE = 0x1000
 
 RSTR_HEADER_STRUCTURE = '<4sHHQIIHHH18sQHHI'  # 4sHHQ IIHHH 18s QHHI (Size = 0x40)
 RCRD_HEADER_STRUCTURE = '<4sHHQIHHHHIQ'  # 4sHHQ IHHHHI Q (Size = 0x28)
@@ -13,31 +16,70 @@ RECORD_HEADER_STRUCTURE = '<QQQIIIIH6sHHHHHHHHHHHHQQ'  # QQ QII IIH6s HHHHHHHH H
 MFT_ENTRY_HEADER = '<IHHQHHHHIIQHHIQ'  # IHHQ HHHHII QHHI Q (Size = 0x38)
 ATTRIBUTE_HEADER_STRUCTURE = '<IIBBHHHQ'  # IIBBHHH Q (Size = 0x18)
 SI_FN_TIME_STRUCTURE = '<QQQQ'  # QQ QQ (Size = 0x20)
+RECORD_FILTER_STRUCTURE = '<6sHHHH8xHHHH'  # 6s HHHH 8x HHHH (Size = 0x1E) alignment_or_reserved1 ~ page_size, at 0x2A
+RECORD_FILTER_OFFSET = 0x2A
 
-def read_struct(f, fmt, cls=None):
-    size = struct.calcsize(fmt)
-    buf = f.read(size)
-    if len(buf) != size:
-        raise EOFError(f"need {size} bytes, got {len(buf)}")
-    data = struct.unpack(fmt, buf)
+FILETIME_TICKS_PER_SECOND = 10_000_000
+FILETIME_EPOCH = datetime(1601, 1, 1)
+FILETIME_DAY_RANGE = ((datetime.min - FILETIME_EPOCH).days, (datetime.max - FILETIME_EPOCH).days)  # Days filetime_date_prefix can render.
+
+@lru_cache(maxsize=None)
+def compiled_struct(fmt):
+    return struct.Struct(fmt)  # Parsed once per format instead of on every call.
+
+def unpack_struct(buf, offset, fmt, cls=None):
+    compiled = compiled_struct(fmt)
+    if offset + compiled.size > len(buf):
+        raise EOFError(f"need {compiled.size} bytes, got {max(len(buf) - offset, 0)}")
+    data = compiled.unpack_from(buf, offset)
     return cls(*data) if cls else data
 
 def convert_windows_timestamp(hex_str, utc=0):
     try:
-        if isinstance(utc, str):
-            utc = int(utc)
-
         timestamp = struct.unpack("<Q", bytes.fromhex(hex_str))[0]
-        if timestamp == 0:
-            return None
+    except Exception:
+        return None
 
-        utc_time = datetime(1970, 1, 1, tzinfo=timezone.utc) + \
-                   timedelta(seconds=(timestamp - 116444736000000000) / 10_000_000)
-        target_tz = timezone(timedelta(hours=utc))
-        local_time = utc_time.astimezone(target_tz)
+    return filetime_to_string(timestamp, utc)
 
-        return local_time.strftime("%Y-%m-%d %H:%M:%S")
-    except Exception:
+def filetime_to_string(filetime, utc=0):
+    if not filetime:
+        return None
+
+    try:
+        seconds = filetime // FILETIME_TICKS_PER_SECOND + utc_offset_seconds(utc)
+    except ValueError:
+        return None
+
+    days, seconds = divmod(seconds, 86400)
+    date_prefix = filetime_date_prefix(days)
+    if date_prefix is None:
+        return None
+
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{date_prefix} {hours:02d}:{minutes:02d}:{seconds:02d}"
+
+def string_to_filetime(text, utc=0):
+    if text.strip().isdigit():
+        return int(text)  # Already a raw FILETIME.
+
+    moment = datetime.fromisoformat(text.strip())
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)  # An explicit offset wins over -t.
+    else:
+        moment -= timedelta(seconds=utc_offset_seconds(utc))  # Read in the -t offset, like the text columns.
+    return (moment - FILETIME_EPOCH) // timedelta(microseconds=1) * 10
+
+@lru_cache(maxsize=None)
+def utc_offset_seconds(utc):
+    return int(utc) * 3600  # Integer hours, as passed with -t.
+
+@lru_cache(maxsize=65536)
+def filetime_date_prefix(days):
+    try:
+        return (FILETIME_EPOCH + timedelta(days=days)).strftime("%Y-%m-%d")  # Days since 1601-01-01.
+    except OverflowError:
         return None
 
 @dataclass
@@ -102,8 +144,7 @@ def print_rcrd_header(rcrd_header):
     print(f"DWord Align          : 0x{rcrd_header.dword_align:08X}")
     print(f"Last End LSN         : 0x{rcrd_header.last_end_lsn:016X}")
     
-@dataclass
-class LogRecordHeader:
+class LogRecordHeader(NamedTuple):  # Built per surviving record, a tuple is far cheaper than a dataclass.
     this_lsn: int
     previous_lsn: int
     client_undo_lsn: int
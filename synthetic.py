@@ -0,0 +1,300 @@
+import argparse
+import random
+import struct
+
+from structure_print import (
+    PAGE_SIZE, RECORD_HEADER_SIZE, MFT_ENTRY_SIZE, CLUSTER_SIZE,
+    RSTR_HEADER_STRUCTURE, RCRD_HEADER_STRUCTURE, MFT_ENTRY_HEADER,
+    FILETIME_TICKS_PER_SECOND
+)
+
+RECORD_DATA_START = 0x40  # First record after the RCRD header and its update sequence array.
+CLIENT_DATA_HEADER_SIZE = 0x28
+UNIX_EPOCH_FILETIME_SECONDS = 11644473600
+ROOT_ENTRY = 5
+FIRST_USER_ENTRY = 16
+
+RECORD_PREFIX = struct.Struct('<QQQIIIIH6s')  # this_lsn ... 6s (Size = 0x30)
+CLIENT_DATA_HEADER = struct.Struct('<HHHHHHHHHHHHQQ')  # redo_op ... target_lcn (Size = 0x28)
+RSTR_HEADER = struct.Struct(RSTR_HEADER_STRUCTURE)
+RCRD_HEADER = struct.Struct(RCRD_HEADER_STRUCTURE)
+MFT_HEADER = struct.Struct(MFT_ENTRY_HEADER)
+ATTRIBUTE_HEADER = struct.Struct('<IIBBHHHIHBB')  # Resident attribute header (Size = 0x18)
+FILE_NAME_CONTENT = struct.Struct('<QQQQQQQIIBB')  # parent ... namespace (Size = 0x42)
+
+DEFAULT_OPCODE_MIX = {
+    'standard_information': 0.3,  # UpdateResidentValue at record offset 0x38
+    'file_name': 0.1,             # UpdateResidentValue at record offset 0x98
+    'other': 0.6,                 # Random opcodes and offsets
+}
+DEFAULT_TIMESTOMP_RATIO = 0.05
+DEFAULT_DIRECTORY_RATIO = 0.1
+SI_FIELD_COUNTS = {0x18: 4, 0x20: 3, 0x28: 2, 0x30: 1}
+TRANSACTION_SLOTS = tuple(range(0x18, 0x18 + 0x28 * 8, 0x28))  # Transaction table entries, reused once a transaction ends.
+TRANSACTION_START_RATIO = 0.3
+TRANSACTION_END_RATIO = 0.2
+
+def seconds_to_filetime(rng, seconds):
+    return (seconds + UNIX_EPOCH_FILETIME_SECONDS) * FILETIME_TICKS_PER_SECOND + rng.randrange(FILETIME_TICKS_PER_SECOND)
+
+def entry_location(mft_entry, cluster_size=CLUSTER_SIZE):
+    byte_offset = mft_entry * MFT_ENTRY_SIZE
+    return byte_offset // cluster_size, byte_offset % cluster_size // 0x200  # target_vcn, cluster_number
+
+def logfile_sequence_bits(page_count):
+    return 64 - ((page_count * PAGE_SIZE).bit_length() - 3)
+
+def build_record_payload(rng, opcode_mix, timestomp_ratio, mft_entry_count):
+    kind = rng.choices(list(opcode_mix), weights=list(opcode_mix.values()))[0]
+    if kind == 'standard_information':
+        attr_offset = rng.choice(tuple(SI_FIELD_COUNTS))
+        base = rng.randrange(1_400_000_000, 1_700_000_000)
+        redo_times = [seconds_to_filetime(rng, base + field) for field in range(SI_FIELD_COUNTS[attr_offset])]
+        undo_times = [seconds_to_filetime(rng, base - 1000 + field) for field in range(SI_FIELD_COUNTS[attr_offset])]
+        is_timestomped = rng.random() < timestomp_ratio
+        if is_timestomped:
+            undo_times, redo_times = redo_times, undo_times  # Redo rolls the clock back.
+
+        mft_entry = rng.randrange(FIRST_USER_ENTRY, max(FIRST_USER_ENTRY + 1, mft_entry_count))
+        target_vcn, cluster_number = entry_location(mft_entry)
+        redo_data = struct.pack(f'<{len(redo_times)}Q', *redo_times)
+        undo_data = struct.pack(f'<{len(undo_times)}Q', *undo_times)
+        return (0x07, 0x07, 0x38, attr_offset, target_vcn, cluster_number, redo_data, undo_data), is_timestomped
+
+    if kind == 'file_name':
+        mft_entry = rng.randrange(FIRST_USER_ENTRY, max(FIRST_USER_ENTRY + 1, mft_entry_count))
+        target_vcn, cluster_number = entry_location(mft_entry)
+        return (0x07, 0x07, 0x98, rng.choice((0x18, 0x20, 0x28, 0x30, 0x38)), target_vcn, cluster_number,
+                rng.randbytes(40), rng.randbytes(40)), False
+
+    return (rng.randrange(0x00, 0x22), rng.randrange(0x00, 0x22), rng.randrange(0, 0x400, 8), rng.randrange(0, 0x100, 8),
+            rng.randrange(0, 1000), rng.choice((0, 2, 4, 6)),
+            rng.randbytes(rng.randrange(1, 64)), rng.randbytes(rng.randrange(0, 64))), False
+
+def next_transaction(rng, transactions):
+    free_slots = [slot for slot in TRANSACTION_SLOTS if slot not in transactions]
+    if free_slots and (not transactions or rng.random() < TRANSACTION_START_RATIO):
+        return 0, rng.choice(free_slots)  # First record of a new transaction.
+    transaction_id = rng.choice(sorted(transactions))
+    return transactions[transaction_id], transaction_id
+
+def build_rcrd_page(rng, page_number, sequence_number, sequence_bits, previous_lsn,
+                    opcode_mix, timestomp_ratio, mft_entry_count, records_per_page=None,
+                    carry=b'', spanning=False, update_sequence=False, transactions=None):
+    page = bytearray(PAGE_SIZE)
+    carried = carry[:PAGE_SIZE - RECORD_DATA_START]  # Tail of the record the previous page ran out of room for.
+    page[RECORD_DATA_START:RECORD_DATA_START + len(carried)] = carried
+    carry = carry[len(carried):]
+    record_offset = RECORD_DATA_START + (len(carried) + 7) // 8 * 8
+    last_lsn = previous_lsn
+    record_count = 0
+    timestomp_count = 0
+
+    while not carry and record_offset + RECORD_HEADER_SIZE <= PAGE_SIZE and (records_per_page is None or record_count < records_per_page):
+        payload, is_timestomped = build_record_payload(rng, opcode_mix, timestomp_ratio, mft_entry_count)
+        redo_op, undo_op, attr_record_offset, attr_offset, target_vcn, cluster_number, redo_data, undo_data = payload
+
+        redo_offset = CLIENT_DATA_HEADER_SIZE
+        undo_offset = redo_offset + (len(redo_data) + 7) // 8 * 8
+        client_data_length = undo_offset + (len(undo_data) + 7) // 8 * 8
+        record_size = RECORD_HEADER_SIZE + client_data_length
+        if record_offset + record_size > PAGE_SIZE and not spanning:
+            break
+
+        this_lsn = (sequence_number << (64 - sequence_bits)) | ((page_number * PAGE_SIZE + record_offset) >> 3)
+        record_type = 0x01 if rng.random() < 0.95 else 0x02
+        if transactions is None:  # One chain through the whole log.
+            record_previous_lsn, transaction_id = last_lsn, rng.randrange(1, 50)
+        else:  # Interleaved transactions, each chained on its own previous LSN.
+            record_previous_lsn, transaction_id = next_transaction(rng, transactions)
+        record = bytearray(record_size)
+        RECORD_PREFIX.pack_into(record, 0, this_lsn, record_previous_lsn, record_previous_lsn, client_data_length, 0, record_type, transaction_id,
+                                0x01 if record_offset + record_size > PAGE_SIZE else 0x00, b'\x00' * 6)  # 0x01 : record crosses the page.
+        CLIENT_DATA_HEADER.pack_into(record, RECORD_HEADER_SIZE,
+                                     redo_op, undo_op, redo_offset, len(redo_data), undo_offset, len(undo_data),
+                                     0, 1, attr_record_offset, attr_offset, cluster_number, 0x02, target_vcn, rng.randrange(0, 100000))
+        record[RECORD_HEADER_SIZE + redo_offset:RECORD_HEADER_SIZE + redo_offset + len(redo_data)] = redo_data
+        record[RECORD_HEADER_SIZE + undo_offset:RECORD_HEADER_SIZE + undo_offset + len(undo_data)] = undo_data
+
+        on_page = record[:PAGE_SIZE - record_offset]
+        page[record_offset:record_offset + len(on_page)] = on_page
+        carry = bytes(record[len(on_page):])
+        if transactions is not None:
+            if rng.random() < TRANSACTION_END_RATIO:
+                transactions.pop(transaction_id, None)  # May end on its first record.
+            else:
+                transactions[transaction_id] = this_lsn
+
+        last_lsn = this_lsn
+        record_offset += record_size
+        record_count += 1
+        timestomp_count += is_timestomped
+
+    RCRD_HEADER.pack_into(page, 0, b'RCRD', 0x28, 0x09, last_lsn, 0, 1, 1, min(record_offset, PAGE_SIZE), 0, 0, last_lsn)
+    if update_sequence:  # Move each sector tail into the update sequence array, as NTFS writes the page.
+        update_sequence_number = rng.randrange(1, 0xFFFF)
+        struct.pack_into('<H', page, 0x28, update_sequence_number)
+        for sector in range(PAGE_SIZE // 0x200):
+            sector_end = (sector + 1) * 0x200 - 2
+            page[0x2A + sector * 2:0x2C + sector * 2] = page[sector_end:sector_end + 2]
+            struct.pack_into('<H', page, sector_end, update_sequence_number)
+    return page, last_lsn, record_count, timestomp_count, carry
+
+def write_logfile(output, page_count, seed=0, opcode_mix=None, timestomp_ratio=DEFAULT_TIMESTOMP_RATIO,
+                  mft_entry_count=0x10000, wrap_page=None, records_per_page=None, spanning=False, update_sequence=False,
+                  transactions=False):
+    if page_count < 5:
+        raise ValueError("A $LogFile needs at least 5 pages (RSTR x2, buffer x2, one RCRD).")
+
+    opcode_mix = opcode_mix or DEFAULT_OPCODE_MIX
+    sequence_bits = logfile_sequence_bits(page_count)
+    wrap_page = wrap_page or 4
+    ring_order = [(page_number, 2) for page_number in range(wrap_page, page_count)] + \
+                 [(page_number, 3) for page_number in range(4, wrap_page)]  # Oldest page first, newest lap last.
+
+    stats = {'pages': page_count, 'records': 0, 'timestomps': 0}
+    current_lsn = 0
+    carry = b''
+    open_transactions = {} if transactions else None  # transaction_id : newest LSN, carried from page to page.
+    last_page = bytes(PAGE_SIZE)
+    with open(output, 'wb') as logfile:
+        logfile.truncate(page_count * PAGE_SIZE)
+        for ring_index, (page_number, sequence_number) in enumerate(ring_order):
+            rng = random.Random(f'{seed}-{page_number}-{sequence_number}')  # Pages are reproducible on their own.
+            page, current_lsn, record_count, timestomp_count, carry = build_rcrd_page(
+                rng, page_number, sequence_number, sequence_bits, current_lsn,
+                opcode_mix, timestomp_ratio, mft_entry_count, records_per_page, carry,
+                spanning and ring_index < len(ring_order) - 1, update_sequence,  # The newest page holds no half-written record.
+                open_transactions
+            )
+            logfile.seek(page_number * PAGE_SIZE)
+            logfile.write(page)
+            last_page = page
+            stats['records'] += record_count
+            stats['timestomps'] += timestomp_count
+
+        for page_number in (2, 3):  # Buffer pages mirror the newest RCRD page.
+            logfile.seek(page_number * PAGE_SIZE)
+            logfile.write(last_page)
+
+        for page_number in (0, 1):
+            rstr_page = bytearray(PAGE_SIZE)
+            RSTR_HEADER.pack_into(rstr_page, 0, b'RSTR', 0x1E, 0x09, 0, PAGE_SIZE, PAGE_SIZE, 0x30, 1, 1, b'\x00' * 18, current_lsn, 1, 0, 0)
+            struct.pack_into('<I', rstr_page, 0x40, sequence_bits)
+            logfile.seek(page_number * PAGE_SIZE)
+            logfile.write(rstr_page)
+
+    return stats
+
+def build_resident_attribute(attr_type, attr_id, content):
+    attr_length = (ATTRIBUTE_HEADER.size + len(content) + 7) // 8 * 8
+    attribute = ATTRIBUTE_HEADER.pack(attr_type, attr_length, 0, 0, 0x18, 0, attr_id, len(content), 0x18, 0x01 if attr_type == 0x30 else 0x00, 0) + content
+    return attribute.ljust(attr_length, b'\x00')
+
+def build_mft_entry(rng, mft_entry, sequence_number, parent_ref, file_name, si_times, fn_times, is_directory=False, in_use=True):
+    entry_buffer = bytearray(MFT_ENTRY_SIZE)
+    si_content = struct.pack('<4Q', *si_times) + b'\x00' * 0x28
+    fn_content = FILE_NAME_CONTENT.pack(parent_ref, *fn_times, 0, 0, 0x10000000 if is_directory else 0x20, 0, len(file_name), 0x01) + file_name.encode('utf-16-le')
+    attributes = b''.join((
+        build_resident_attribute(0x10, 0, si_content),
+        build_resident_attribute(0x30, 1, fn_content),
+        build_resident_attribute(0x80, 2, b''),
+    )) + b'\xFF\xFF\xFF\xFF\x00\x00\x00\x00'
+
+    flags = (0x01 if in_use else 0x00) | (0x02 if is_directory else 0x00)
+    first_attr_offset = MFT_HEADER.size
+    entry_buffer[:MFT_HEADER.size] = MFT_HEADER.pack(0x454C4946, 0x30, 3, 0, sequence_number, 1, first_attr_offset, flags,
+                                                     first_attr_offset + len(attributes), MFT_ENTRY_SIZE, 0, 3, 0, mft_entry, 0)
+    entry_buffer[first_attr_offset:first_attr_offset + len(attributes)] = attributes
+
+    update_sequence = rng.randrange(1, 0xFFFF)  # Move each sector tail into the update sequence array.
+    struct.pack_into('<H', entry_buffer, 0x30, update_sequence)
+    for sector in range(2):
+        sector_end = (sector + 1) * 0x200 - 2
+        entry_buffer[0x32 + sector * 2:0x34 + sector * 2] = entry_buffer[sector_end:sector_end + 2]
+        struct.pack_into('<H', entry_buffer, sector_end, update_sequence)
+    return entry_buffer
+
+def write_mft(output, entry_count, seed=0, timestomp_ratio=DEFAULT_TIMESTOMP_RATIO, directory_ratio=DEFAULT_DIRECTORY_RATIO):
+    rng = random.Random(f'{seed}-mft')
+    directories = {ROOT_ENTRY: ROOT_ENTRY}  # mft_entry : sequence_number
+    stats = {'entries': entry_count, 'in_use': 0, 'timestomps': 0}
+
+    with open(output, 'wb') as mftfile:
+        for mft_entry in range(entry_count):
+            base = rng.randrange(1_400_000_000, 1_700_000_000)
+            fn_times = [seconds_to_filetime(rng, base + field) for field in range(4)]
+            if mft_entry < FIRST_USER_ENTRY:
+                is_directory = mft_entry == ROOT_ENTRY
+                mftfile.write(build_mft_entry(rng, mft_entry, ROOT_ENTRY if is_directory else 1, ROOT_ENTRY | (ROOT_ENTRY << 48),
+                                              '.' if is_directory else f'$Meta{mft_entry}', fn_times, fn_times, is_directory))
+                stats['in_use'] += 1
+                continue
+
+            if rng.random() < 0.05:
+                mftfile.write(bytes(MFT_ENTRY_SIZE))  # Never used.
+                continue
+
+            is_directory = rng.random() < directory_ratio
+            in_use = rng.random() > 0.02
+            is_timestomped = rng.random() < timestomp_ratio
+            si_times = fn_times
+            if is_timestomped and rng.random() < 0.5:  # Tool-style backdating, whole seconds before the FN times.
+                si_times = [(filetime // FILETIME_TICKS_PER_SECOND - 1000 * 86400) * FILETIME_TICKS_PER_SECOND for filetime in fn_times]
+            elif is_timestomped:  # SI rewritten after the FN times were recorded.
+                si_times = [filetime + 100 * FILETIME_TICKS_PER_SECOND for filetime in fn_times]
+            sequence_number = rng.randrange(1, 50)
+            parent_entry = rng.choice(tuple(directories))
+            file_name = f'dir{mft_entry}' if is_directory else f'file{mft_entry}.txt'
+
+            mftfile.write(build_mft_entry(rng, mft_entry, sequence_number, parent_entry | (directories[parent_entry] << 48),
+                                          file_name, si_times, fn_times, is_directory, in_use))
+            if is_directory and in_use:
+                directories[mft_entry] = sequence_number
+            stats['in_use'] += in_use
+            stats['timestomps'] += is_timestomped and in_use
+
+    return stats
+
+def parse_size(size):
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    size = size.strip().upper().rstrip('B')
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+def parse_opcode_mix(opcode_mix):
+    weights = {}
+    for item in opcode_mix.split(','):
+        kind, _, weight = item.partition('=')
+        if kind.strip() not in DEFAULT_OPCODE_MIX:
+            raise ValueError(f"Unknown record kind: {kind.strip()} ({', '.join(DEFAULT_OPCODE_MIX)}).")
+        weights[kind.strip()] = float(weight)
+    return weights
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic $LogFile and matching $MFT.")
+    parser.add_argument("-f", "--logfile", required=True, help="Output $LogFile path.")
+    parser.add_argument("-m", "--mft", required=False, help="Output $MFT path (optional).")
+    parser.add_argument("-s", "--size", default="64M", help="$LogFile size, e.g. 64M, 1G.")
+    parser.add_argument("-e", "--mft-entries", type=int, default=0x10000, help="Number of $MFT entries.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument("--timestomp-ratio", type=float, default=DEFAULT_TIMESTOMP_RATIO, help="Share of SI records and entries that are time-stomped.")
+    parser.add_argument("--opcode-mix", default=None, help="Record kind weights, e.g. standard_information=0.3,file_name=0.1,other=0.6.")
+    parser.add_argument("--records-per-page", type=int, default=None, help="Upper bound of records per RCRD page.")
+    parser.add_argument("--spanning", action="store_true", help="Let records run over into the next page.")
+    parser.add_argument("--update-sequence", action="store_true", help="Protect each RCRD page with an update sequence array.")
+    parser.add_argument("--transactions", action="store_true", help="Chain records per transaction instead of through the whole log.")
+    parser.add_argument("--wrap-page", type=int, default=None, help="Page where the newest lap of the ring starts.")
+    args = parser.parse_args()
+
+    page_count = parse_size(args.size) // PAGE_SIZE
+    opcode_mix = parse_opcode_mix(args.opcode_mix) if args.opcode_mix else None
+    logfile_stats = write_logfile(args.logfile, page_count, args.seed, opcode_mix, args.timestomp_ratio,
+                                  args.mft_entries, args.wrap_page, args.records_per_page, args.spanning, args.update_sequence,
+                                  args.transactions)
+    print(f"[+] $LogFile : {logfile_stats['pages']} pages, {logfile_stats['records']} records, {logfile_stats['timestomps']} time-stomps.")
+
+    if args.mft:
+        mft_stats = write_mft(args.mft, args.mft_entries, args.seed, args.timestomp_ratio)
+        print(f"[+] $MFT : {mft_stats['entries']} entries, {mft_stats['in_use']} in use, {mft_stats['timestomps']} time-stomps.")
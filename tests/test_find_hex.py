@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from log_record import find_hex
+
+
+def find_hex_loop(logfile_data, search_hexs, byte_size):
+    # The 8-byte stepping loop find_hex replaced, kept as the reference.
+    if not isinstance(search_hexs, list):
+        search_hexs = [search_hexs]
+
+    compiled_patterns = []
+    for pattern in search_hexs:
+        if isinstance(pattern, int):
+            compiled_patterns.append(pattern.to_bytes(byte_size, byteorder='little'))
+        elif isinstance(pattern, bytes):
+            if len(pattern) != byte_size:
+                raise ValueError(f"Byte pattern must be exactly {byte_size} bytes long.")
+            compiled_patterns.append(pattern)
+        else:
+            raise TypeError("Patterns must be int or bytes.")
+
+    matched_offsets = []
+    offset = 0
+    data_len = len(logfile_data)
+
+    while offset + byte_size <= data_len:
+        segment = logfile_data[offset:offset + byte_size]
+        if segment in compiled_patterns:
+            matched_offsets.append(offset)
+        offset += 8
+
+    return sorted(matched_offsets)
+
+
+def random_buffer(rng, size, patterns):
+    # Random bytes from a small alphabet, with the patterns planted at aligned and unaligned offsets.
+    data = bytearray(rng.choice(b'\x00\x01\xff') for _ in range(size))
+    for _ in range(size // 16):
+        pattern = rng.choice(patterns)
+        offset = rng.randrange(0, size - len(pattern) + 1)
+        data[offset:offset + len(pattern)] = pattern
+    return bytes(data)
+
+
+@pytest.mark.parametrize('byte_size', [2, 8])
+@pytest.mark.parametrize('as_int', [False, True])
+@pytest.mark.parametrize('seed', range(20))
+def test_find_hex_matches_loop(seed, as_int, byte_size):
+    rng = random.Random(seed * 31 + byte_size)
+    patterns = [bytes(rng.choice(b'\x00\x01\xff') for _ in range(byte_size)) for _ in range(rng.randint(1, 3))]
+    patterns.append(patterns[0])  # Duplicates must not report an offset twice.
+    search_hexs = [int.from_bytes(pattern, 'little') for pattern in patterns] if as_int else patterns
+
+    data = random_buffer(rng, rng.randint(64, 2048), patterns)
+    start = rng.randrange(0, len(data) // 2)
+    end = rng.randrange(start, len(data) + 16)  # May run past the buffer.
+
+    expected = find_hex_loop(data[start:end], search_hexs, byte_size)
+    assert find_hex(data, search_hexs, byte_size, start, end) == expected
+    assert find_hex(memoryview(data), search_hexs, byte_size, start, end) == expected
+    assert find_hex(data[start:end], search_hexs, byte_size) == expected
+
+
+@pytest.mark.parametrize('byte_size', [2, 8])
+def test_find_hex_single_pattern(byte_size):
+    pattern = b'\xab' * byte_size
+    data = bytes(3) + pattern + bytes(5) + pattern + bytes(24) + pattern
+    for start in range(0, 9):
+        assert find_hex(data, pattern, byte_size, start) == find_hex_loop(data[start:], pattern, byte_size)
+        assert find_hex(data, int.from_bytes(pattern, 'little'), byte_size, start, len(data) - 1) == \
+            find_hex_loop(data[start:-1], pattern, byte_size)
+
+
+def test_find_hex_rejects_bad_patterns():
+    with pytest.raises(ValueError):
+        find_hex(bytes(16), b'\x00\x00\x00', 2)
+    with pytest.raises(TypeError):
+        find_hex(bytes(16), 'RCRD', 4)
@@ -0,0 +1,62 @@
+import sqlite3
+
+import pytest
+
+from parse_logfile import parse_logfile
+from parse_timestamp import parse_timestomp
+from synthetic import write_logfile
+
+PAGE_COUNT = 256  # 1 MiB $LogFile
+
+
+def ingest(logfile_path, db_path, incremental, reassemble):
+    with open(logfile_path, 'rb') as logfile:
+        parse_logfile(logfile, str(logfile_path), incremental=incremental, db_path=str(db_path), reassemble=reassemble)
+    parse_timestomp(str(db_path), 0)
+
+
+def table_rows(db_path, query):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+
+def logfile_rows(db_path):
+    return table_rows(db_path, 'SELECT * FROM LogFile')
+
+
+def timestomp_rows(db_path):
+    return table_rows(db_path, 'SELECT this_lsn, is_timestomped, redo_create_filetime, undo_create_filetime FROM TimeStomp')
+
+
+@pytest.mark.parametrize('spanning', [False, True])
+def test_incremental_run_adds_only_the_newer_records(tmp_path, spanning):
+    # The same ring at two points in time, the later one has written pages 100-149 of its newest lap on top.
+    earlier_path = tmp_path / 'earlier.bin'
+    later_path = tmp_path / 'later.bin'
+    write_logfile(earlier_path, PAGE_COUNT, 3, wrap_page=100, spanning=spanning, update_sequence=spanning)
+    write_logfile(later_path, PAGE_COUNT, 3, wrap_page=150, spanning=spanning, update_sequence=spanning)
+
+    ingest(earlier_path, tmp_path / 'earlier.db', incremental=False, reassemble=spanning)
+    ingest(later_path, tmp_path / 'later.db', incremental=False, reassemble=spanning)
+    earlier_rows = logfile_rows(tmp_path / 'earlier.db')
+    later_rows = logfile_rows(tmp_path / 'later.db')
+    newest_lsn = max(row[0] for row in earlier_rows)
+    newer_rows = [row for row in later_rows if row[0] > newest_lsn]
+    assert newer_rows
+
+    incremental_db = tmp_path / 'incremental.db'
+    ingest(earlier_path, incremental_db, incremental=False, reassemble=spanning)
+    ingest(later_path, incremental_db, incremental=True, reassemble=spanning)
+    assert logfile_rows(incremental_db) == earlier_rows + newer_rows
+
+    newer_lsns = {row[0] for row in newer_rows}
+    expected_timestomps = timestomp_rows(tmp_path / 'earlier.db') + \
+        [row for row in timestomp_rows(tmp_path / 'later.db') if row[0] in newer_lsns]
+    assert timestomp_rows(incremental_db) == expected_timestomps
+
+    ingest(later_path, incremental_db, incremental=True, reassemble=spanning)  # Nothing new the second time.
+    assert logfile_rows(incremental_db) == earlier_rows + newer_rows
+    assert timestomp_rows(incremental_db) == expected_timestomps
@@ -0,0 +1,58 @@
+import random
+import sqlite3
+
+from parse_mft import parse_mft, ORPHAN_PATH, ROOT_ENTRY
+from structure_print import MFT_ENTRY_SIZE
+from synthetic import build_mft_entry, FILETIME_TICKS_PER_SECOND
+
+FN_TIMES = [131140694223640409 + field * FILETIME_TICKS_PER_SECOND for field in range(4)]
+STOMPED_TIMES = [filetime + 100 * FILETIME_TICKS_PER_SECOND for filetime in FN_TIMES]  # Flagged by si_newer.
+
+
+def reference(mft_entry, sequence_number):
+    return mft_entry | (sequence_number << 48)
+
+
+MFT_ENTRIES = {  # mft_entry : (sequence_number, parent reference, name, is_directory, SI times)
+    ROOT_ENTRY: (5, reference(ROOT_ENTRY, 5), '.', True, FN_TIMES),
+    16: (3, reference(ROOT_ENTRY, 5), 'Users', True, FN_TIMES),
+    17: (4, reference(16, 3), 'bob', True, FN_TIMES),
+    18: (1, reference(17, 4), 'evil.exe', False, STOMPED_TIMES),
+    19: (1, reference(17, 9), 'stale.txt', False, STOMPED_TIMES),  # Entry 17 was reused since.
+    20: (1, reference(21, 1), 'a', True, FN_TIMES),
+    21: (1, reference(20, 1), 'b', True, FN_TIMES),                  # a and b are each other's parent.
+    22: (1, reference(20, 1), 'loop.txt', False, STOMPED_TIMES),
+    23: (1, reference(16, 3), 'plain.txt', False, FN_TIMES),
+    24: (2, reference(ROOT_ENTRY, 0), 'no_sequence.txt', False, STOMPED_TIMES),  # Sequence 0 is not checked.
+}
+
+
+def write_mft(mft_path):
+    rng = random.Random(0)
+    with open(mft_path, 'wb') as mftfile:
+        for mft_entry in range(max(MFT_ENTRIES) + 1):
+            if mft_entry not in MFT_ENTRIES:
+                mftfile.write(bytes(MFT_ENTRY_SIZE))
+                continue
+            sequence_number, parent_ref, name, is_directory, si_times = MFT_ENTRIES[mft_entry]
+            mftfile.write(build_mft_entry(rng, mft_entry, sequence_number, parent_ref, name, si_times, FN_TIMES, is_directory))
+
+
+def test_flagged_entries_get_their_full_path(tmp_path):
+    mft_path = tmp_path / 'MFT.bin'
+    db_path = tmp_path / 'log_records.db'
+    write_mft(mft_path)
+    with open(mft_path, 'rb') as mftfile:
+        parse_mft(mftfile, str(mft_path), 0, str(db_path))
+
+    conn = sqlite3.connect(db_path)
+    try:
+        full_paths = dict(conn.execute('SELECT mft_entry, full_path FROM si_fn'))
+    finally:
+        conn.close()
+
+    assert sorted(full_paths) == [18, 19, 22, 24]  # Only flagged entries are kept and resolved.
+    assert full_paths[18] == '\\Users\\bob\\evil.exe'
+    assert full_paths[19] == f'{ORPHAN_PATH}\\stale.txt'
+    assert full_paths[22] == f'{ORPHAN_PATH}\\b\\a\\loop.txt'  # The cycle is cut where it closes.
+    assert full_paths[24] == '\\no_sequence.txt'
@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+from page_source import PageSource
+from page_stream import parse_pages_reassembled
+from parse_logfile import parse_logfile, ring_page_numbers
+from structure_print import PAGE_SIZE, RECORD_HEADER_SIZE
+from synthetic import write_logfile, logfile_sequence_bits, CLIENT_DATA_HEADER_SIZE
+
+PAGE_COUNT = 256  # 1 MiB $LogFile
+LSN_OFFSET_MASK = (1 << (64 - logfile_sequence_bits(PAGE_COUNT))) - 1
+
+
+def parse_rows(logfile_path, db_path, reassemble):
+    with open(logfile_path, 'rb') as logfile:
+        parse_logfile(logfile, str(logfile_path), db_path=str(db_path), reassemble=reassemble)
+    conn = sqlite3.connect(db_path)
+    try:
+        return {row[0]: row[1:] for row in conn.execute('''
+            SELECT this_lsn, previous_lsn, redo_data, redo_data_length, undo_data, undo_data_length, target_vcn, transaction_id
+            FROM LogFile
+        ''')}
+    finally:
+        conn.close()
+
+
+def within_page(this_lsn, row):
+    # Records the page-local parse reads whole, the others run on into the next page's header.
+    record_offset = ((this_lsn & LSN_OFFSET_MASK) << 3) % PAGE_SIZE
+    redo_length, undo_length = row[2], row[4]
+    return record_offset + RECORD_HEADER_SIZE + CLIENT_DATA_HEADER_SIZE + (redo_length + 7) // 8 * 8 + (undo_length + 7) // 8 * 8 <= PAGE_SIZE
+
+
+@pytest.mark.parametrize('wrap_page', [4, 5, 88, 200, PAGE_COUNT - 1])  # 5 puts the current LSN on page 4, 88 is the benchmark's.
+@pytest.mark.parametrize('seed', [0, 4, 7])
+def test_reassembly_recovers_every_record(tmp_path, seed, wrap_page):
+    usa_path = tmp_path / 'usa.bin'
+    plain_path = tmp_path / 'plain.bin'
+    generated = write_logfile(usa_path, PAGE_COUNT, seed, wrap_page=wrap_page, spanning=True, update_sequence=True)
+    write_logfile(plain_path, PAGE_COUNT, seed, wrap_page=wrap_page, spanning=True)  # Same records, sector tails left in place.
+
+    reassembled = parse_rows(usa_path, tmp_path / 'usa.db', reassemble=True)
+    assert len(reassembled) == generated['records']
+    lsns = sorted(reassembled)
+    assert [reassembled[this_lsn][0] for this_lsn in lsns[1:]] == lsns[:-1]  # One previous-LSN chain, no gap and no stray row.
+
+    page_local = parse_rows(plain_path, tmp_path / 'plain.db', reassemble=False)
+    whole_lsns = [this_lsn for this_lsn, row in reassembled.items() if within_page(this_lsn, row)]
+    assert len(whole_lsns) > generated['records'] * 0.9
+    assert all(reassembled[this_lsn] == page_local.get(this_lsn) for this_lsn in whole_lsns)  # Fixups restore the stored bytes.
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_reassembly_from_any_start_page(tmp_path, seed):
+    # Each -w page range starts its own window, the page before it only tells where its carried record ends.
+    logfile_path = tmp_path / 'usa.bin'
+    write_logfile(logfile_path, PAGE_COUNT, seed, wrap_page=88, spanning=True, update_sequence=True)
+    with open(logfile_path, 'rb') as logfile, PageSource(logfile) as source:
+        page_numbers = ring_page_numbers(87, source.size)
+        whole_ring = [[record[0] for record in records] for records in parse_pages_reassembled(source, page_numbers)]
+        for start in range(1, len(page_numbers) - 1):
+            window = parse_pages_reassembled(source, page_numbers[start:start + 2])
+            assert [[record[0] for record in records] for records in window] == whole_ring[start:start + 2], start
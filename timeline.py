@@ -0,0 +1,121 @@
+import csv
+import json
+import sqlite3
+import sys
+
+import stats
+from log_record import to_sqlite_int
+from parse_logfile import get_schema_version, table_exists
+from structure_print import filetime_to_string
+
+TIMELINE_FIELDS = ('create', 'modified', 'mft_modified', 'last_access')
+TIMELINE_SIDES = {  # table : the two FILETIME sets of each row
+    'TimeStomp': ('undo', 'redo'),
+    'si_fn': ('si', 'fn'),
+}
+TIMELINE_COLUMN_FIELDS = {  # table : field -> column prefix where they differ
+    'si_fn': {'modified': 'mft_modified', 'mft_modified': 'modified'},  # si_fn keeps the SIFNTime order, on-disk 0x10 sits in *_modified_*.
+}
+TIMELINE_COLUMNS = ('filetime', 'source', 'source_rowid', 'side', 'field', 'this_lsn', 'mft_entry', 'attr_name', 'is_timestomped', 'full_path')
+TIMELINE_OUTPUT_COLUMNS = ('time', *TIMELINE_COLUMNS)
+TIMELINE_FORMATS = ('csv', 'jsonl')
+
+def init_timeline_db(conn):
+    cursor = conn.cursor()
+    cursor.execute('DROP TABLE IF EXISTS Timeline')  # Rebuilt from TimeStomp / si_fn by the first query after a run.
+    cursor.execute('''
+        CREATE TABLE Timeline (
+            filetime INTEGER,
+            source TEXT,
+            source_rowid INTEGER,
+            side TEXT,
+            field TEXT,
+            this_lsn INTEGER,
+            mft_entry INTEGER,
+            attr_name TEXT,
+            is_timestomped INTEGER,
+            full_path TEXT,
+            PRIMARY KEY (filetime, source, source_rowid, side, field)
+        ) WITHOUT ROWID
+    ''')  # Clustered on the UTC FILETIME, a time window is one range scan of the table itself.
+
+def timeline_select(table_name, side, field):
+    this_lsn = 'this_lsn' if table_name == 'TimeStomp' else 'NULL'
+    attr_name = 'attr_name' if table_name == 'TimeStomp' else ("'STANDARD_INFORMATION'" if side == 'si' else "'FILE_NAME'")
+    column = f'{side}_{TIMELINE_COLUMN_FIELDS.get(table_name, {}).get(field, field)}_filetime'
+    return f'''
+        SELECT {column}, '{table_name}', rowid, '{side}', '{field}',
+               {this_lsn}, mft_entry, {attr_name}, is_timestomped, full_path
+        FROM {table_name}
+        WHERE {column} IS NOT NULL
+    '''
+
+def build_timeline(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        if get_schema_version(conn) < 2:  # Only the native schema has the *_filetime columns.
+            return 0
+
+        init_timeline_db(conn)
+        for table_name, sides in TIMELINE_SIDES.items():
+            if not table_exists(conn, table_name):
+                continue
+            selects = [timeline_select(table_name, side, field) for side in sides for field in TIMELINE_FIELDS]
+            conn.execute(f'INSERT INTO Timeline ({", ".join(TIMELINE_COLUMNS)}) {" UNION ALL ".join(selects)} ORDER BY 1')  # Near key order.
+
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE INDEX idx_timeline_entry
+            ON Timeline (mft_entry, filetime, is_timestomped, this_lsn, attr_name, full_path)
+        ''')  # Covers the per-entry history, the primary key columns ride along.
+        cursor.execute('''
+            CREATE INDEX idx_timeline_flagged
+            ON Timeline (filetime, this_lsn, mft_entry, attr_name, full_path)
+            WHERE is_timestomped = 1
+        ''')
+        cursor.execute('ANALYZE Timeline')
+        event_count = conn.execute('SELECT count(*) FROM Timeline').fetchone()[0]
+        stats.count('timeline.events', event_count)
+        conn.commit()
+        return event_count
+    finally:
+        conn.close()
+
+def query_timeline(conn, start=None, end=None, mft_entry=None, flagged_only=False, source=None, limit=None):
+    conditions = []
+    params = []
+    if start is not None:
+        conditions.append('filetime >= ?')
+        params.append(to_sqlite_int(start))
+    if end is not None:
+        conditions.append('filetime < ?')  # Half open, consecutive windows never share an event.
+        params.append(to_sqlite_int(end))
+    if mft_entry is not None:
+        conditions.append('mft_entry = ?')
+        params.append(mft_entry)
+    if flagged_only:
+        conditions.append('is_timestomped = 1')
+    if source is not None:
+        conditions.append('source = ?')
+        params.append(source)
+
+    where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+    limit_clause = 'LIMIT ?' if limit is not None else ''
+    if limit is not None:
+        params.append(limit)
+    return conn.execute(f'SELECT {", ".join(TIMELINE_COLUMNS)} FROM Timeline {where} ORDER BY filetime {limit_clause}', params)
+
+def write_timeline_rows(rows, utc_offset, output_format='csv', output=None):
+    output = output or sys.stdout
+    row_count = 0
+    if output_format == 'jsonl':
+        for row in rows:
+            output.write(json.dumps(dict(zip(TIMELINE_OUTPUT_COLUMNS, (filetime_to_string(row[0] & 0xFFFFFFFFFFFFFFFF, utc_offset), *row)))) + "\n")
+            row_count += 1
+    else:
+        writer = csv.writer(output)
+        writer.writerow(TIMELINE_OUTPUT_COLUMNS)
+        for row in rows:
+            writer.writerow((filetime_to_string(row[0] & 0xFFFFFFFFFFFFFFFF, utc_offset), *row))
+            row_count += 1
+    return row_count